@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+AgentStream = AsyncIterator[Dict[str, Any]]
+
+_DONE = object()
+
+
+def sse_frame(event: Dict[str, Any]) -> bytes:
+    """Encode one agent event as a Server-Sent Events frame named after its type."""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n".encode()
+
+
+class StreamStats:
+    """Counters for /metrics: open streams, how they ended, and time to first token."""
+
+    def __init__(self):
+        self.counters = {"opened": 0, "completed": 0, "disconnected": 0, "errors": 0, "tokens": 0,
+                         "producer_waits": 0, "session_waits": 0}
+        self.active = 0
+        self._first_token_total = 0.0
+        self._first_token_count = 0
+
+    def first_token(self, seconds: float):
+        self._first_token_total += seconds
+        self._first_token_count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "active": self.active,
+                "avg_first_token_seconds": (self._first_token_total / self._first_token_count
+                                            if self._first_token_count else None)}
+
+
+async def stream_agent_events(events: AgentStream, is_disconnected: Callable[[], Awaitable[bool]],
+                              stats: StreamStats, buffer_size: int = 64, heartbeat: float = 15.0,
+                              lock: Optional[asyncio.Lock] = None) -> AsyncIterator[bytes]:
+    """
+    Relay an agent event stream (AGEAN.astream) to one HTTP client as SSE.
+
+    A producer task pulls events into a bounded queue of buffer_size events.
+    When the client reads slower than the model produces, the queue fills and
+    the producer stops pulling, which in turn stops reading the LLM response:
+    memory per connection stays bounded and backpressure reaches the provider.
+    When the client goes away (StreamingResponse cancels this generator, or
+    is_disconnected() reports it while idle) the producer is cancelled, which cancels the
+    in-flight LLM request instead of letting it run to completion. A comment
+    line is sent every heartbeat seconds of silence to keep proxies from
+    closing slow tool calls. With lock (the session's, from AgentSessions),
+    the agent is only run while holding it, so a second stream for the same
+    session waits for the first instead of interleaving the chat history.
+    """
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=buffer_size)
+    started = time.perf_counter()
+    first_token = True
+
+    async def produce():
+        try:
+            if lock is not None:
+                if lock.locked():
+                    stats.counters["session_waits"] += 1
+                await lock.acquire()
+            try:
+                async for event in events:
+                    if queue.full():
+                        stats.counters["producer_waits"] += 1
+                    await queue.put(event)
+            finally:
+                if lock is not None:
+                    lock.release()
+        except Exception as e:
+            await queue.put({"type": "error", "content": f"Error: {e}"})
+        finally:
+            await events.aclose()
+        await queue.put(_DONE)
+
+    producer = asyncio.ensure_future(produce())
+    stats.counters["opened"] += 1
+    stats.active += 1
+    outcome = "disconnected"
+    try:
+        # Flush headers immediately so the client sees the stream open before the first token
+        yield b": stream open\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield b": keep-alive\n\n"
+                continue
+            if event is _DONE:
+                outcome = "completed"
+                yield sse_frame({"type": "done"})
+                break
+            if event.get("type") == "token":
+                stats.counters["tokens"] += 1
+                if first_token:
+                    first_token = False
+                    stats.first_token(time.perf_counter() - started)
+            elif event.get("type") == "error":
+                stats.counters["errors"] += 1
+            yield sse_frame(event)
+    finally:
+        stats.active -= 1
+        stats.counters[outcome] += 1
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class AgentSessions:
+    """
+    AGEAN instances per analyst session, so chat histories don't mix, each
+    with a lock that serializes streams on the session. At most max_sessions
+    are kept, dropping the least recently used.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 100):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self._agents: "OrderedDict[str, Tuple[Any, asyncio.Lock]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Any:
+        return self.session(session_id)[0]
+
+    def session(self, session_id: str) -> Tuple[Any, asyncio.Lock]:
+        """The session's agent and the lock to hold while running it."""
+        session = self._agents.get(session_id)
+        if session is None:
+            session = self._agents[session_id] = (self.factory(), asyncio.Lock())
+            while len(self._agents) > self.max_sessions:
+                self._agents.popitem(last=False)
+        else:
+            self._agents.move_to_end(session_id)
+        return session
+
+
+def default_agent_factory() -> Any:
+    # Imported lazily: the agent stack is only needed once a stream is requested
+    from src.core_agent.agean import AGEAN
+    return AGEAN(streaming=True)
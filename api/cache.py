@@ -0,0 +1,100 @@
+import fnmatch
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+class SearchCache:
+    """
+    LRU + TTL cache of encoded /search responses, bounded in bytes.
+
+    Keys are a hash of the canonicalized (index, query) pair, so equivalent
+    queries with differently ordered keys share an entry. Writes to an index
+    invalidate every entry whose index expression (including wildcards and
+    comma-separated lists) matches it, and bump that index's generation so a
+    search that was already in flight during the write cannot store its
+    now-stale result.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 30.0,
+                 max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self._entries: "OrderedDict[str, Tuple[str, float, bytes]]" = OrderedDict()
+        self._keys_by_index: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                         "invalidations": 0, "uncacheable": 0}
+
+    @staticmethod
+    def key(index: str, query: Dict[str, Any]) -> str:
+        canonical = json.dumps([index, query], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def generation(self, index: str) -> int:
+        """Combined write generation of every written index the expression matches."""
+        patterns = [pattern.strip() for pattern in index.split(",")]
+        return sum(gen for name, gen in self._generations.items()
+                   if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns))
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        index, expires_at, body = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return body
+
+    def put(self, key: str, index: str, body: bytes, generation: int):
+        """Store body unless the index was written since `generation` was read."""
+        if len(body) > self.max_entry_bytes or generation != self.generation(index):
+            self.counters["uncacheable"] += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (index, time.monotonic() + self.ttl, body)
+        self._keys_by_index.setdefault(index, set()).add(key)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def invalidate(self, index: str):
+        """Drop cached results for every index expression that covers `index`."""
+        self._generations[index] = self._generations.get(index, 0) + 1
+        for expression in list(self._keys_by_index):
+            patterns = [pattern.strip() for pattern in expression.split(",")]
+            if any(fnmatch.fnmatchcase(index, pattern) for pattern in patterns):
+                for key in list(self._keys_by_index.get(expression, ())):
+                    self._remove(key)
+                    self.counters["invalidations"] += 1
+
+    def _remove(self, key: str):
+        index, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+        keys = self._keys_by_index.get(index)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_index[index]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,227 @@
+"""
+Load-test harness for the API server against a local Elasticsearch stand-in.
+
+The stand-in is a small aiohttp app that speaks enough of the Elasticsearch
+REST API for the server (ping, _search, point-in-time paging with
+search_after, _doc, _bulk, aliases) and adds a fixed
+latency to every search, like a real cluster under load. The harness drives
+concurrent /search requests through the server in-process and reports
+throughput and latency for:
+
+  * before: the original handler shape, a sync Elasticsearch client called
+    from an async def (every request serializes on the event loop)
+  * after:  server.app, the AsyncElasticsearch client from the lifespan,
+    with the /search result cache disabled and then enabled (every request
+    repeats the same hunting query, so the cached run is mostly hits)
+
+Usage:
+    python api/loadtest.py --requests 400 --concurrency 50 --es-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class ElasticsearchStandIn:
+    """Minimal in-memory Elasticsearch REST stand-in."""
+
+    PRODUCT_HEADERS = {"X-Elastic-Product": "Elasticsearch"}
+
+    def __init__(self, latency: float = 0.0, hits: int = 10):
+        self.latency = latency
+        self.documents: Dict[str, List[Dict[str, Any]]] = {"logs": [
+            {"_index": "logs", "_id": str(i), "_score": 1.0, "_source": {"n": i, "event": {"action": "login"}}}
+            for i in range(hits)
+        ]}
+        self.requests = 0
+        self.open_pits: Dict[str, str] = {}
+
+    def _json(self, body: Any, status: int = 200) -> web.Response:
+        return web.json_response(body, status=status, headers=self.PRODUCT_HEADERS)
+
+    async def root(self, request: web.Request) -> web.Response:
+        return self._json({"name": "stand-in", "version": {"number": "8.15.0"}, "tagline": "You Know, for Search"})
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json() if request.can_read_body else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "pit" in body:
+            pit_id = body["pit"]["id"]
+            if pit_id not in self.open_pits:
+                return self._json({"error": {"type": "search_context_missing_exception"}}, status=404)
+            index = self.open_pits[pit_id]
+        else:
+            index = request.match_info.get("index", "logs")
+        hits = self.documents.get(index, [])
+        size = body.get("size", 10)
+        start = body["search_after"][-1] + 1 if "search_after" in body else 0
+        page = [dict(hit, sort=[position]) for position, hit in enumerate(hits[start:start + size], start)]
+        response = {"took": int(self.latency * 1000), "timed_out": False,
+                    "hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": page}}
+        if "pit" in body:
+            response["pit_id"] = body["pit"]["id"]
+        return self._json(response)
+
+    async def open_pit(self, request: web.Request) -> web.Response:
+        pit_id = f"pit-{len(self.open_pits)}-{request.match_info['index']}"
+        self.open_pits[pit_id] = request.match_info["index"]
+        return self._json({"id": pit_id})
+
+    async def close_pit(self, request: web.Request) -> web.Response:
+        self.open_pits.pop((await request.json())["id"], None)
+        return self._json({"succeeded": True, "num_freed": 1})
+
+    async def bulk(self, request: web.Request) -> web.Response:
+        lines = [json.loads(line) for line in (await request.read()).splitlines() if line.strip()]
+        items = []
+        for action, document in zip(lines[::2], lines[1::2]):
+            meta = action["index"]
+            stored = self.documents.setdefault(meta["_index"], [])
+            _id = meta.get("_id", str(len(stored)))
+            stored.append({"_index": meta["_index"], "_id": _id, "_score": 1.0, "_source": document})
+            items.append({"index": {"_index": meta["_index"], "_id": _id, "status": 201, "result": "created"}})
+        return self._json({"took": 1, "errors": False, "items": items})
+
+    async def index(self, request: web.Request) -> web.Response:
+        index = request.match_info["index"]
+        stored = self.documents.setdefault(index, [])
+        _id = str(len(stored))
+        stored.append({"_index": index, "_id": _id, "_score": 1.0, "_source": await request.json()})
+        return self._json({"_index": index, "_id": _id, "result": "created"}, status=201)
+
+    async def aliases(self, request: web.Request) -> web.Response:
+        return self._json({index: {"aliases": {}} for index in self.documents})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/", self.root)
+        app.router.add_post("/{index}/_search", self.search)
+        app.router.add_post("/_search", self.search)
+        app.router.add_post("/{index}/_pit", self.open_pit)
+        app.router.add_delete("/_pit", self.close_pit)
+        app.router.add_route("*", "/_bulk", self.bulk)
+        app.router.add_post("/{index}/_doc", self.index)
+        app.router.add_get("/_alias", self.aliases)
+        return app
+
+    def serve_in_thread(self, port: int):
+        """
+        Serve on its own event loop in a daemon thread, so a client that blocks
+        the caller's loop (the sync-client baseline) cannot stall the stand-in.
+        Returns a callable that stops the server.
+        """
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(self.app(), access_log=None)
+        started = threading.Event()
+
+        async def start():
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+            started.set()
+
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(start(), loop)
+        started.wait()
+
+        def stop():
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+        return stop
+
+
+def legacy_app(es_url: str):
+    """The pre-lifespan handler shape: a sync client inside async def."""
+    from elasticsearch import Elasticsearch
+    from fastapi import FastAPI
+    from server import SearchQuery
+
+    es = Elasticsearch([es_url])
+    app = FastAPI()
+
+    @app.post("/search")
+    async def search_documents(search_query: SearchQuery):
+        response = es.search(index=search_query.index, body=search_query.query)
+        return {"results": response['hits']['hits']}
+
+    return app
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def drive(app, total: int, concurrency: int, cache: bool = True) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = iter(range(total))
+    payload = {"index": "logs", "query": {"query": {"match": {"event.action": "login"}}}}
+
+    async with app.router.lifespan_context(app):
+        if not cache:
+            from cache import SearchCache
+            app.state.search_cache = SearchCache(max_bytes=0)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            async def worker():
+                for _ in remaining:
+                    start = time.perf_counter()
+                    response = await client.post("/search", json=payload)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return {"rps": total / elapsed, "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+
+async def run(args):
+    stand_in = ElasticsearchStandIn(latency=args.es_latency)
+    stop = stand_in.serve_in_thread(args.port)
+    os.environ["ELASTIC_HOST"], os.environ["ELASTIC_PORT"] = "127.0.0.1", str(args.port)
+    os.environ.setdefault("ES_CONNECTIONS_PER_NODE", str(args.concurrency))
+    import server
+
+    try:
+        results = {
+            "before (sync client)": await drive(legacy_app(f"http://127.0.0.1:{args.port}"),
+                                                args.requests, args.concurrency),
+            "after (async client)": await drive(server.app, args.requests, args.concurrency, cache=False),
+            "after + result cache": await drive(server.app, args.requests, args.concurrency),
+        }
+    finally:
+        stop()
+
+    print(f"/search x{args.requests}, concurrency={args.concurrency}, es latency={args.es_latency * 1000:.0f}ms")
+    for name, result in results.items():
+        print(f"{name:22s} {result['rps']:8.1f} req/s  p50={result['p50'] * 1000:7.1f}ms  "
+              f"p99={result['p99'] * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--es-latency", type=float, default=0.02, help="Stand-in search latency (s)")
+    parser.add_argument("--port", type=int, default=9299)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
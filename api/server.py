@@ -1,22 +1,74 @@
+import json
 import os
-from typing import Any, Dict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from elasticsearch import Elasticsearch
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from elasticsearch import AsyncElasticsearch
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 
-app = FastAPI()
+from agent_stream import AgentSessions, StreamStats, default_agent_factory, stream_agent_events
+from cache import SearchCache
 
 # Elasticsearch configuration
 ELASTIC_PASSWORD = os.getenv("ELASTIC_PASSWORD")
-ELASTIC_HOST = "elasticsearch"  # This should match the service name in docker-compose
-ELASTIC_PORT = "9200"
+ELASTIC_HOST = os.getenv("ELASTIC_HOST", "elasticsearch")  # This should match the service name in docker-compose
+ELASTIC_PORT = os.getenv("ELASTIC_PORT", "9200")
 
-# Initialize Elasticsearch client
-es = Elasticsearch(
-    [f"http://{ELASTIC_HOST}:{ELASTIC_PORT}"],
-    basic_auth=("elastic", ELASTIC_PASSWORD)
-)
+# Connection pool and timeouts for the async client
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "25"))
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "10"))
+ES_BULK_REQUEST_TIMEOUT = float(os.getenv("ES_BULK_REQUEST_TIMEOUT", "60"))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+
+# Bulk indexing limits per _bulk request (overridable per call)
+BULK_MAX_DOCS = int(os.getenv("BULK_MAX_DOCS", "1000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# /search result cache
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+
+# /agent/stream: events buffered per connection, idle heartbeat, and agent sessions kept
+AGENT_STREAM_BUFFER = int(os.getenv("AGENT_STREAM_BUFFER", "64"))
+AGENT_STREAM_HEARTBEAT = float(os.getenv("AGENT_STREAM_HEARTBEAT", "15"))
+AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "100"))
+
+
+def create_es_client() -> AsyncElasticsearch:
+    return AsyncElasticsearch(
+        [f"http://{ELASTIC_HOST}:{ELASTIC_PORT}"],
+        basic_auth=("elastic", ELASTIC_PASSWORD) if ELASTIC_PASSWORD else None,
+        connections_per_node=ES_CONNECTIONS_PER_NODE,
+        request_timeout=ES_REQUEST_TIMEOUT,
+        max_retries=ES_MAX_RETRIES,
+        retry_on_timeout=True,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per process; closed after in-flight requests drain on shutdown
+    app.state.es = create_es_client()
+    app.state.search_cache = SearchCache(max_bytes=SEARCH_CACHE_MAX_BYTES, ttl=SEARCH_CACHE_TTL)
+    app.state.agents = AgentSessions(default_agent_factory, max_sessions=AGENT_MAX_SESSIONS)
+    app.state.stream_stats = StreamStats()
+    try:
+        yield
+    finally:
+        await app.state.es.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def get_es(request: Request) -> AsyncElasticsearch:
+    return request.app.state.es
+
+
+def get_search_cache(request: Request) -> SearchCache:
+    return request.app.state.search_cache
 
 class Document(BaseModel):
     index: str
@@ -27,41 +79,236 @@ class SearchQuery(BaseModel):
     index: str
     query: Dict[str, Any]
 
+class StreamSearchQuery(SearchQuery):
+    page_size: int = Field(default=1000, gt=0, le=10000)
+    keep_alive: str = "1m"
+
+class AgentQuery(BaseModel):
+    query: str
+    session_id: str = "default"
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the ELK Stack API"}
 
 @app.get("/health")
-async def health_check():
-    if es.ping():
+async def health_check(es: AsyncElasticsearch = Depends(get_es)):
+    if await es.options(request_timeout=2).ping():
         return {"status": "healthy", "elasticsearch": "connected"}
     else:
         raise HTTPException(status_code=503, detail="Elasticsearch is not available")
 
 @app.post("/index")
-async def index_document(document: Document):
+async def index_document(document: Document, es: AsyncElasticsearch = Depends(get_es),
+                         cache: SearchCache = Depends(get_search_cache)):
     try:
-        response = es.index(index=document.index, doc_type=document.doc_type, body=document.body)
+        # Mapping types were removed in Elasticsearch 8; doc_type is accepted but not sent
+        response = await es.index(index=document.index, document=document.body)
+        cache.invalidate(document.index)
         return {"message": "Document indexed successfully", "response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _iter_documents(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Incrementally parse a request body that is either NDJSON (one document per
+    line) or a JSON array of documents, without buffering the whole body.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pending = b""
+    mode = None  # "array" or "ndjson"
+    async for chunk in request.stream():
+        pending += chunk
+        try:
+            buffer += pending.decode("utf-8")
+            pending = b""
+        except UnicodeDecodeError:
+            # Chunk boundary split a multi-byte character; wait for the rest
+            continue
+        if mode is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            while True:
+                buffer = buffer.lstrip().lstrip(",").lstrip()
+                if not buffer or buffer[0] == "]":
+                    break
+                try:
+                    document, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    # Incomplete document; read more of the body
+                    break
+                buffer = buffer[end:]
+                yield document
+    if mode == "ndjson" and buffer.strip():
+        yield json.loads(buffer)
+    elif mode == "array" and buffer.strip() not in ("", "]"):
+        raise ValueError("Unterminated JSON array in request body")
+
+
+async def _bulk_chunk(es: AsyncElasticsearch, cache: SearchCache, index: str,
+                      operations: List[bytes], count: int) -> List[Dict[str, Any]]:
+    try:
+        response = await es.options(request_timeout=ES_BULK_REQUEST_TIMEOUT).bulk(operations=operations)
+        return response["items"]
+    except Exception as e:
+        return [{"index": {"status": 500, "error": str(e)}}] * count
+    finally:
+        # Even a failed request may have partially applied
+        cache.invalidate(index)
+
+
+@app.post("/bulk")
+async def bulk_index(request: Request, index: str, max_docs: Optional[int] = Query(None, gt=0),
+                     max_bytes: Optional[int] = Query(None, gt=0), es: AsyncElasticsearch = Depends(get_es),
+                     cache: SearchCache = Depends(get_search_cache)):
+    """
+    Index an NDJSON or JSON-array body of documents into `index` through the
+    _bulk API, chunked by max_docs / max_bytes per request. A document's `_id`
+    key, if present, is used as its id. Returns one result per document.
+    """
+    max_docs = BULK_MAX_DOCS if max_docs is None else max_docs
+    max_bytes = BULK_MAX_BYTES if max_bytes is None else max_bytes
+    items: List[Dict[str, Any]] = []
+    operations: List[bytes] = []
+    chunk_docs = chunk_bytes = 0
+
+    try:
+        async for document in _iter_documents(request):
+            if not isinstance(document, dict):
+                raise ValueError("Each document must be a JSON object")
+            action: Dict[str, Any] = {"_index": index}
+            if "_id" in document:
+                action["_id"] = document.pop("_id")
+            lines = [json.dumps({"index": action}).encode(), json.dumps(document).encode()]
+            size = len(lines[0]) + len(lines[1]) + 2
+            if chunk_docs and (chunk_docs >= max_docs or chunk_bytes + size > max_bytes):
+                items.extend(await _bulk_chunk(es, cache, index, operations, chunk_docs))
+                operations, chunk_docs, chunk_bytes = [], 0, 0
+            operations.extend(lines)
+            chunk_docs += 1
+            chunk_bytes += size
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body after {len(items) + chunk_docs} documents: {e}")
+
+    if chunk_docs:
+        items.extend(await _bulk_chunk(es, cache, index, operations, chunk_docs))
+
+    results = [item.get("index", item) for item in items]
+    return {
+        "indexed": sum(1 for result in results if result.get("status", 500) < 300),
+        "errors": any(result.get("status", 500) >= 300 for result in results),
+        "items": results,
+    }
+
 @app.post("/search")
-async def search_documents(search_query: SearchQuery):
+async def search_documents(search_query: SearchQuery, es: AsyncElasticsearch = Depends(get_es),
+                           cache: SearchCache = Depends(get_search_cache)):
+    key = cache.key(search_query.index, search_query.query)
+    body = cache.get(key)
+    if body is None:
+        generation = cache.generation(search_query.index)
+        try:
+            response = await es.search(index=search_query.index, body=search_query.query)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        body = json.dumps({"results": response['hits']['hits']}).encode()
+        cache.put(key, search_query.index, body, generation)
+    return Response(content=body, media_type="application/json")
+
+def _page_body(query: Dict[str, Any], pit_id: str, keep_alive: str, page_size: int,
+               search_after: Optional[List[Any]]) -> Dict[str, Any]:
+    body = {key: value for key, value in query.items() if key not in ("from", "size", "search_after", "pit")}
+    sort = body.get("sort", [])
+    sort = list(sort) if isinstance(sort, list) else [sort]
+    # search_after needs a unique tiebreaker; _shard_doc is the cheapest one under a PIT
+    if not any(clause == "_shard_doc" or (isinstance(clause, dict) and "_shard_doc" in clause) for clause in sort):
+        sort.append({"_shard_doc": "asc"})
+    body.update(sort=sort, size=page_size, pit={"id": pit_id, "keep_alive": keep_alive},
+                track_total_hits=False)
+    if search_after is not None:
+        body["search_after"] = search_after
+    return body
+
+
+async def _stream_hits(es: AsyncElasticsearch, search_query: StreamSearchQuery) -> AsyncIterator[bytes]:
+    # The PIT is opened on first iteration so a client that disconnects before
+    # the body starts never leaves one open until keep_alive expires
+    search_after = pit_id = None
     try:
-        response = es.search(index=search_query.index, body=search_query.query)
-        return {"results": response['hits']['hits']}
+        pit = await es.open_point_in_time(index=search_query.index, keep_alive=search_query.keep_alive)
+        pit_id = pit["id"]
+        while True:
+            response = await es.search(body=_page_body(search_query.query, pit_id, search_query.keep_alive,
+                                                       search_query.page_size, search_after))
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if not hits:
+                break
+            yield "".join(json.dumps(hit) + "\n" for hit in hits).encode()
+            if len(hits) < search_query.page_size:
+                break
+            search_after = hits[-1]["sort"]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Headers are already sent; report the failure in-band as the last line
+        yield (json.dumps({"error": str(e)}) + "\n").encode()
+    finally:
+        if pit_id is not None:
+            try:
+                await es.close_point_in_time(id=pit_id)
+            except Exception:
+                pass
+
+
+@app.post("/search/stream")
+async def stream_search_documents(search_query: StreamSearchQuery, es: AsyncElasticsearch = Depends(get_es)):
+    """
+    Stream every hit for a query as NDJSON, paging with search_after over a
+    point-in-time so server memory stays at one page regardless of hit count.
+    Errors, including failing to open the PIT, are reported as a final
+    {"error": ...} line.
+    """
+    return StreamingResponse(_stream_hits(es, search_query), media_type="application/x-ndjson")
+
+@app.post("/agent/stream")
+async def stream_agent(agent_query: AgentQuery, request: Request):
+    """
+    Stream an agent's token, tool_start, final and error events as SSE, ending
+    with a done event. Closing the connection cancels the underlying LLM call.
+    Streams for the same session run one at a time.
+    """
+    try:
+        agent, lock = request.app.state.agents.session(agent_query.session_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Agent unavailable: {e}")
+    stream = stream_agent_events(agent.astream(agent_query.query), request.is_disconnected,
+                                 request.app.state.stream_stats, buffer_size=AGENT_STREAM_BUFFER,
+                                 heartbeat=AGENT_STREAM_HEARTBEAT, lock=lock)
+    # X-Accel-Buffering stops nginx-style proxies from holding tokens back
+    return StreamingResponse(stream, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics")
+async def metrics(request: Request, cache: SearchCache = Depends(get_search_cache)):
+    return {"search_cache": cache.stats(), "agent_streams": request.app.state.stream_stats.stats()}
 
 @app.get("/indices")
-async def list_indices():
+async def list_indices(es: AsyncElasticsearch = Depends(get_es)):
     try:
-        indices = es.indices.get_alias().keys()
+        indices = (await es.indices.get_alias()).keys()
         return {"indices": list(indices)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=30)
\ No newline at end of file
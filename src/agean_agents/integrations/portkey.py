@@ -1,13 +1,17 @@
 import os
+import time
 from dotenv import load_dotenv, find_dotenv
 from google.cloud import secretmanager
 from openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from llama_index import ChatOllama
-from portkey_ai import Portkey
 from portkey_ai.exceptions import PortkeyAPIError, PortkeyRateLimitError
 from together import Together
 from llm import load_env, get_env_variable, access_secret_version, get_llm_config
+from llm_cache import get_response_cache
+from llm_clients import get_client_registry
+from llm_gateway import backoff_delay
+from llm_prompt_cache import get_prompt_cache_stats, with_cache_control
 
 def load_env():
     """
@@ -25,56 +29,77 @@ def load_env():
 
 
 # Function for handling retries and fallback using Portkey
-def get_chat_completion_with_fallback(messages, model, max_tokens, max_retries=3):
+def get_chat_completion_with_fallback(messages, model, max_tokens, max_retries=3, temperature=None, cache=None,
+                                      agent="default"):
     """
     Attempts to get a chat completion using Anthropic, with fallback to OpenAI on failure or load balancing.
+    temperature is only sent when given (the provider default otherwise); completions requested
+    with an explicit temperature of 0 are served from the response cache when possible.
     """
-    portkey_api_key = get_env_variable("PORTKEY_API_KEY")
-    claude_virtual_key = get_env_variable("ANTHROPIC_VIRTUAL_KEY")
-    openai_virtual_key = get_env_variable("OPENAI_VIRTUAL_KEY")
+    cache = cache or get_response_cache()
+    cache_key = cache.key(model, messages, max_tokens, "anthropic") if temperature == 0 else None
+    sampling = {} if temperature is None else {"temperature": temperature}
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    # Initialize Portkey for Anthropic
-    portkey_anthropic = Portkey(
-        api_key=portkey_api_key,
-        virtual_key=claude_virtual_key,
-        anthropic_beta="prompt-caching-2024-07-31"
-    )
+    # Clients and secrets are shared across calls (see llm_clients)
+    registry = get_client_registry(config_loader=get_llm_config)
+    portkey_anthropic = registry.client("anthropic")
 
     retry_count = 0
     while retry_count < max_retries:
         try:
-            # Attempt Anthropic call
+            # Attempt Anthropic call, with cache breakpoints after the stable prefix
+            started = time.monotonic()
             chat_completion = portkey_anthropic.chat.completions.create(
-                messages=messages,
+                messages=with_cache_control(messages),
                 model=model,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **sampling
             )
-            return chat_completion.choices[0].message.content
+            get_prompt_cache_stats().record(agent, getattr(chat_completion, "usage", None),
+                                            time.monotonic() - started)
+            content = chat_completion.choices[0].message.content
+            if cache_key and content is not None:
+                cache.put(cache_key, content)
+            return content
         
         except (PortkeyRateLimitError, PortkeyAPIError) as e:
             retry_count += 1
             print(f"Anthropic API error: {e}. Retry {retry_count}/{max_retries}.")
+            if retry_count < max_retries:
+                time.sleep(backoff_delay(retry_count - 1))
         
             # If retries exhausted, fallback to OpenAI
             if retry_count == max_retries:
                 print("Falling back to OpenAI after retries exhausted.")
-                portkey_openai = Portkey(
-                    api_key=portkey_api_key,
-                    virtual_key=openai_virtual_key
-                )
+                fallback_model = "gpt-4-turbo"  # OpenAI model example
+                # The fallback's answers are cached under its own provider and model
+                fallback_key = cache.key(fallback_model, messages, max_tokens, "openai") if cache_key else None
+                if fallback_key:
+                    cached = cache.get(fallback_key)
+                    if cached is not None:
+                        return cached
+                portkey_openai = registry.client("openai")
                 chat_completion = portkey_openai.chat.completions.create(
                     messages=messages,
-                    model="gpt-4-turbo",  # OpenAI model example
-                    max_tokens=max_tokens
+                    model=fallback_model,
+                    max_tokens=max_tokens,
+                    **sampling
                 )
-                return chat_completion.choices[0].message.content
+                content = chat_completion.choices[0].message.content
+                if fallback_key and content is not None:
+                    cache.put(fallback_key, content)
+                return content
 
 # Function to set up and return the LLM based on provider
 def set_llm(provider: str = "anthropic"):
     """
     Sets up the appropriate LLM provider (Anthropic, OpenAI, or Ollama) based on the provider name.
     """
-    llm_config = get_llm_config()
+    llm_config = get_client_registry(config_loader=get_llm_config).llm_config()
     
     # Match provider with the corresponding LLM
     if provider == "anthropic":
@@ -0,0 +1,233 @@
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.ecs_fields import CidrSet, make_accessor
+
+BENIGN = "benign"
+SUSPICIOUS = "suspicious"
+MALICIOUS = "malicious"
+VERDICTS = (BENIGN, SUSPICIOUS, MALICIOUS)
+SEVERITIES = ("low", "medium", "high", "critical")
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+# ECS fields checked against the CIDR lists and the indicator set
+IP_FIELDS = ("source.ip", "destination.ip")
+INDICATOR_FIELDS = ("source.ip", "destination.ip", "destination.domain", "url.domain", "dns.question.name",
+                    "file.hash.md5", "file.hash.sha1", "file.hash.sha256", "threat.indicator")
+
+
+def _normalize_verdict(verdict: Any, rule: str, allowed: Tuple[str, ...] = VERDICTS) -> str:
+    """Lower-case a configured verdict, rejecting ones the rule type cannot produce at load time."""
+    normalized = str(verdict).strip().lower()
+    if normalized not in allowed:
+        raise ValueError(f"Prefilter rule {rule} has unsupported verdict {verdict}; expected one of {allowed}")
+    return normalized
+
+
+def _normalize_severity(severity: Any, rule: str) -> str:
+    """Lower-case a configured severity ("High" -> "high"), rejecting unknown ones at load time."""
+    normalized = str(severity).strip().lower()
+    if normalized not in SEVERITIES:
+        raise ValueError(f"Prefilter rule {rule} has unsupported severity {severity}; expected one of {SEVERITIES}")
+    return normalized
+
+
+def _compile_condition(field: str, condition: Any) -> Predicate:
+    """
+    Compile one field condition. A bare value means equality; a dict may use
+    in, not_in, regex, prefix, suffix, gt/gte/lt/lte, cidr and exists.
+    """
+    get = make_accessor(field)
+    if not isinstance(condition, dict):
+        return lambda event: get(event) == condition
+
+    checks: List[Callable[[Any], bool]] = []
+    for operator, operand in condition.items():
+        if operator == "in":
+            members = frozenset(operand)
+            checks.append(lambda value, members=members: value in members)
+        elif operator == "not_in":
+            members = frozenset(operand)
+            checks.append(lambda value, members=members: value not in members)
+        elif operator == "regex":
+            pattern = re.compile(operand)
+            checks.append(lambda value, pattern=pattern: isinstance(value, str) and pattern.search(value) is not None)
+        elif operator == "prefix":
+            checks.append(lambda value, operand=operand: isinstance(value, str) and value.startswith(operand))
+        elif operator == "suffix":
+            checks.append(lambda value, operand=operand: isinstance(value, str) and value.endswith(operand))
+        elif operator in ("gt", "gte", "lt", "lte"):
+            compare = {"gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+                       "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b}[operator]
+            checks.append(lambda value, operand=operand, compare=compare:
+                          isinstance(value, (int, float)) and compare(value, operand))
+        elif operator == "cidr":
+            networks = CidrSet([operand] if isinstance(operand, str) else operand)
+            checks.append(lambda value, networks=networks: value in networks)
+        elif operator == "exists":
+            checks.append(lambda value, operand=operand: (value is not None) == bool(operand))
+        else:
+            raise ValueError(f"Unsupported prefilter operator for {field}: {operator}")
+
+    def predicate(event: Dict[str, Any]) -> bool:
+        value = get(event)
+        return all(check(value) for check in checks)
+
+    return predicate
+
+
+def _compile_match(match: Dict[str, Any]) -> Predicate:
+    predicates = [_compile_condition(field, condition) for field, condition in match.items()]
+    return lambda event: all(predicate(event) for predicate in predicates)
+
+
+class RateThreshold:
+    """
+    Sliding-window counter per key value (e.g. failed logins per source.ip);
+    fires once a key reaches `threshold` matching events within `window`
+    seconds, with verdict benign, suspicious or malicious. Tracks at most
+    max_keys keys, evicting the least recently seen.
+    """
+
+    def __init__(self, name: str, key: str, threshold: int, window: float, verdict: str = MALICIOUS,
+                 severity: str = "high", match: Optional[Dict[str, Any]] = None, max_keys: int = 100000):
+        self.name = name
+        self.key = make_accessor(key)
+        self.threshold = threshold
+        self.window = window
+        self.verdict = _normalize_verdict(verdict, name)
+        self.severity = _normalize_severity(severity, name)
+        self.match = _compile_match(match) if match else None
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[Any, Deque[float]]" = OrderedDict()
+
+    def observe(self, event: Dict[str, Any], now: float) -> bool:
+        if self.match is not None and not self.match(event):
+            return False
+        key = self.key(event)
+        if key is None:
+            return False
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque()
+            if len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+        else:
+            self._hits.move_to_end(key)
+        hits.append(now)
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        return len(hits) >= self.threshold
+
+
+class EventPrefilter:
+    """
+    Deterministic rule engine run before LLM threat analysis.
+
+    Rules are compiled once into closures over the ECS fields they test, so
+    evaluating an event costs a few dict lookups and comparisons. They are
+    checked in order of precedence:
+
+      1. deny_cidrs on source/destination IP, and the indicator set
+         (IPs, domains, hashes): malicious
+      2. malicious match rules, then rate thresholds
+      3. allow_cidrs (every IP present must be allowed) and benign match rules
+
+    The first hit resolves the event. Events no rule resolves are ambiguous
+    and are forwarded to the LLM. stats() reports the forwarded fraction.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, allow_cidrs: Iterable[str] = (),
+                 deny_cidrs: Iterable[str] = (), indicators: Iterable[str] = (),
+                 rate_thresholds: Optional[List[Dict[str, Any]]] = None):
+        self.allow = CidrSet(allow_cidrs)
+        self.deny = CidrSet(deny_cidrs)
+        self.indicators = frozenset(str(indicator).lower() for indicator in indicators)
+        self._ip_fields = [(field, make_accessor(field)) for field in IP_FIELDS]
+        self._indicator_fields = [(field, make_accessor(field)) for field in INDICATOR_FIELDS]
+        self._malicious: List[Tuple[str, str, Predicate]] = []
+        self._benign: List[Tuple[str, str, Predicate]] = []
+        for position, rule in enumerate(rules or []):
+            name = rule.get("name", f"rule-{position}")
+            verdict = _normalize_verdict(rule["verdict"], name, (BENIGN, MALICIOUS))
+            severity = _normalize_severity(rule.get("severity", "low" if verdict == BENIGN else "high"), name)
+            compiled = (name, severity, _compile_match(rule["match"]))
+            (self._malicious if verdict == MALICIOUS else self._benign).append(compiled)
+        self.rates = [RateThreshold(**spec) for spec in rate_thresholds or []]
+        self.counters: Dict[str, int] = {"evaluated": 0, **{verdict: 0 for verdict in VERDICTS}, "forwarded": 0}
+        self.rule_hits: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "EventPrefilter":
+        """
+        Load a JSON config with the constructor's keys: rules, allow_cidrs,
+        deny_cidrs, indicators and rate_thresholds.
+        """
+        with open(path, "r") as f:
+            return cls(**json.load(f))
+
+    def evaluate(self, event: Dict[str, Any], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return {"verdict", "severity", "rule"} for an event a rule resolves, or
+        None if it is ambiguous and should go to the LLM.
+        """
+        self.counters["evaluated"] += 1
+        result = self._evaluate(event, time.monotonic() if now is None else now)
+        if result is None:
+            self.counters["forwarded"] += 1
+            return None
+        self.counters[result["verdict"]] += 1
+        self.rule_hits[result["rule"]] = self.rule_hits.get(result["rule"], 0) + 1
+        return result
+
+    def partition(self, events: List[Dict[str, Any]]) -> Tuple[Dict[int, Dict[str, Any]], List[int]]:
+        """Resolved verdicts by event index, and the indices to forward to the LLM."""
+        resolved: Dict[int, Dict[str, Any]] = {}
+        forwarded: List[int] = []
+        for index, event in enumerate(events):
+            result = self.evaluate(event)
+            if result is None:
+                forwarded.append(index)
+            else:
+                resolved[index] = result
+        return resolved, forwarded
+
+    def _evaluate(self, event: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+        ips = [(field, get(event)) for field, get in self._ip_fields]
+        ips = [(field, ip) for field, ip in ips if ip]
+
+        if self.deny:
+            for field, ip in ips:
+                if ip in self.deny:
+                    return {"verdict": MALICIOUS, "severity": "high", "rule": f"deny_cidr:{field}"}
+        if self.indicators:
+            for field, get in self._indicator_fields:
+                value = get(event)
+                if isinstance(value, str) and value.lower() in self.indicators:
+                    return {"verdict": MALICIOUS, "severity": "critical", "rule": f"indicator:{field}"}
+        for name, severity, predicate in self._malicious:
+            if predicate(event):
+                return {"verdict": MALICIOUS, "severity": severity, "rule": name}
+        fired = None
+        for rate in self.rates:
+            # Every threshold observes the event so its window stays accurate
+            if rate.observe(event, now) and fired is None:
+                fired = {"verdict": rate.verdict, "severity": rate.severity, "rule": rate.name}
+        if fired is not None:
+            return fired
+
+        if self.allow and ips and all(ip in self.allow for _, ip in ips):
+            return {"verdict": BENIGN, "severity": "low", "rule": "allow_cidr"}
+        for name, severity, predicate in self._benign:
+            if predicate(event):
+                return {"verdict": BENIGN, "severity": severity, "rule": name}
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        evaluated = self.counters["evaluated"]
+        return {**self.counters, "forwarded_fraction": self.counters["forwarded"] / evaluated if evaluated else 0.0,
+                "rule_hits": dict(self.rule_hits)}
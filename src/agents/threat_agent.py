@@ -1,14 +1,42 @@
 import asyncio
 import json
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
 from langchain.agents import AgentExecutor
+from pydantic import BaseModel, Field, ValidationError
 
 from core_agent import AGEAN
 from src.llm import get_llm
 from src.prompts_config import CTIPrompts, _get_prompts_agent
 from src.agents import threat_agent
+from src.agents.prefilter import EventPrefilter
+
+BATCH_PROMPT = (
+    "Analyze each network event below independently. Events are given one per line as "
+    "<index>: <compact JSON>.\n"
+    "Respond with ONLY a JSON object of the form "
+    '{{"verdicts": [{{"index": <int>, "verdict": "benign|suspicious|malicious", '
+    '"severity": "low|medium|high|critical", "confidence": <0..1>, "reason": "<one sentence>"}}]}} '
+    "containing exactly one verdict for every index listed.\n\n{events}"
+)
+# Prompt tokens reserved for BATCH_PROMPT itself, and output tokens budgeted per verdict
+BATCH_PROMPT_TOKENS = 150
+VERDICT_TOKENS = 40
+
+
+class EventVerdict(BaseModel):
+    """Verdict for one event of a batch, keyed by its index in the batch."""
+
+    index: int
+    verdict: Literal["benign", "suspicious", "malicious"]
+    severity: Literal["low", "medium", "high", "critical"]
+    confidence: float = Field(ge=0.0, le=1.0)
+    reason: str = ""
+
+
+class BatchVerdicts(BaseModel):
+    verdicts: List[EventVerdict]
 
 
 class ThreatDetectionAgent(AGEAN):
@@ -19,14 +47,17 @@ class ThreatDetectionAgent(AGEAN):
                  verbose: bool = True, 
                  streaming: bool = False, 
                  prompts: CTIPrompts = cti.threat_prompts._get_prompts(), 
-                 accumulate_chat_history: bool = True):
+                 accumulate_chat_history: bool = True,
+                 prefilter: Optional[EventPrefilter] = None):
         """
         Initializes the ThreatDetectionAgent with specific LLM, prompts, and behavior settings.
+        An optional EventPrefilter resolves obvious events before they reach the LLM.
         """
         super().__init__(name=name, accumulate_chat_history=accumulate_chat_history, 
                          verbose=verbose, streaming=streaming)
         self.llm = llm
         self.prompts = prompts
+        self.prefilter = prefilter
         self.__verbose = verbose
 
     # Core and critical methods for Threat Detection Agent
@@ -86,6 +117,15 @@ class ThreatDetectionAgent(AGEAN):
         """
         if not hasattr(self, 'data'):
             raise ValueError("No data has been received for analysis.")
+
+        # Deterministic rules settle obvious events without an LLM call
+        if self.prefilter is not None:
+            verdict = self.prefilter.evaluate(self.data)
+            if verdict is not None:
+                response = self._to_json({"prefilter": verdict})
+                if self.__verbose:
+                    print(f"Threat analysis result (prefilter): {response}")
+                return response
         
         # Example: use LLM to analyze the event or log data
         query = f"Analyze this network event: {self._to_json(self.data)}"
@@ -96,6 +136,128 @@ class ThreatDetectionAgent(AGEAN):
         
         return response
 
+    # Batch analysis
+
+    @staticmethod
+    def _compact_event(event: Dict[str, Any], max_value_chars: int = 256) -> str:
+        """
+        Flatten an event to dotted keys, drop empty values, clip long strings and
+        serialize without whitespace, so many events fit in one prompt.
+        """
+        flat: Dict[str, Any] = {}
+
+        def walk(prefix: str, value: Any):
+            if isinstance(value, dict):
+                for key, nested in value.items():
+                    walk(f"{prefix}.{key}" if prefix else str(key), nested)
+            elif value is not None and value != "" and value != [] and value != {}:
+                if isinstance(value, str) and len(value) > max_value_chars:
+                    value = value[:max_value_chars] + "..."
+                flat[prefix] = value
+
+        walk("", event)
+        return json.dumps(flat, separators=(",", ":"), default=str)
+
+    @staticmethod
+    def _pack_events(compacted: List[Tuple[int, str]], token_budget: int,
+                     max_events: int) -> List[List[Tuple[int, str]]]:
+        """Greedily pack (index, compact event) pairs into chunks within the token budget."""
+        chunks: List[List[Tuple[int, str]]] = []
+        chunk: List[Tuple[int, str]] = []
+        used = BATCH_PROMPT_TOKENS
+        for index, line in compacted:
+            cost = (len(line) + 12) // 4 + VERDICT_TOKENS
+            if chunk and (used + cost > token_budget or len(chunk) >= max_events):
+                chunks.append(chunk)
+                chunk, used = [], BATCH_PROMPT_TOKENS
+            chunk.append((index, line))
+            used += cost
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _parse_verdicts(output: str, indices: List[int]) -> Optional[Dict[int, EventVerdict]]:
+        """Validated verdicts by index, or None unless every index got exactly one."""
+        start, end = output.find("{"), output.rfind("}")
+        if start == -1 or end <= start:
+            return None
+        try:
+            parsed = BatchVerdicts.model_validate_json(output[start:end + 1])
+        except ValidationError:
+            return None
+        verdicts = {verdict.index: verdict for verdict in parsed.verdicts}
+        if len(parsed.verdicts) != len(indices) or set(verdicts) != set(indices):
+            return None
+        return verdicts
+
+    def _complete_prompt(self, prompt: str) -> str:
+        """One direct LLM call, outside the executor and chat history."""
+        result = self.llm.invoke(prompt)
+        return getattr(result, "content", result)
+
+    def analyze_batch(self, events: List[Dict[str, Any]], token_budget: int = 8000,
+                      max_events_per_call: int = 50,
+                      complete: Optional[Callable[[str], str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Analyze many events with few LLM calls.
+
+        Events are compacted and packed into prompts bounded by token_budget
+        (prompt plus expected output) and max_events_per_call. The LLM returns
+        one structured verdict per event index, which is validated against
+        EventVerdict. A chunk whose output does not parse or misses an index is
+        split in half and retried, down to single events; an event that still
+        fails gets None. Errors from complete() itself (provider or transport
+        failures) are not retried by splitting and propagate. With a
+        prefilter, events it resolves get a verdict from the matching rule and
+        never reach the LLM.
+
+        Args:
+            events (List[Dict[str, Any]]): Events to analyze.
+            token_budget (int): Token budget per LLM call.
+            max_events_per_call (int): Upper bound on events per LLM call.
+            complete (Callable[[str], str], optional): Prompt -> completion text.
+                Defaults to calling the agent's LLM directly.
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: Verdict dicts aligned with events.
+        """
+        complete = complete or self._complete_prompt
+        results: List[Optional[Dict[str, Any]]] = [None] * len(events)
+        stats = {"events": len(events), "prefiltered": 0, "llm_calls": 0, "resplits": 0, "failed": 0}
+
+        forwarded = list(range(len(events)))
+        if self.prefilter is not None:
+            resolved, forwarded = self.prefilter.partition(events)
+            for index, verdict in resolved.items():
+                results[index] = EventVerdict(index=index, verdict=verdict["verdict"], severity=verdict["severity"],
+                                              confidence=1.0, reason=f"prefilter rule {verdict['rule']}").model_dump()
+            stats["prefiltered"] = len(resolved)
+        compacted = [(index, self._compact_event(events[index])) for index in forwarded]
+
+        pending = self._pack_events(compacted, token_budget, max_events_per_call)
+        while pending:
+            chunk = pending.pop()
+            prompt = BATCH_PROMPT.format(events="\n".join(f"{index}: {line}" for index, line in chunk))
+            stats["llm_calls"] += 1
+            # Only unparseable output is re-split; a failing call would fail the same way for each half
+            verdicts = self._parse_verdicts(complete(prompt), [index for index, _ in chunk])
+            if verdicts is not None:
+                for index, verdict in verdicts.items():
+                    results[index] = verdict.model_dump()
+            elif len(chunk) > 1:
+                stats["resplits"] += 1
+                middle = len(chunk) // 2
+                pending.extend([chunk[middle:], chunk[:middle]])
+            else:
+                stats["failed"] += 1
+
+        self.batch_stats = stats
+        if self.__verbose:
+            print(f"Batch analysis: {stats['events']} events ({stats['prefiltered']} prefiltered) in "
+                  f"{stats['llm_calls']} LLM calls ({stats['resplits']} re-splits, {stats['failed']} failed)")
+        return results
+
     def generate_report(self) -> str:
         """
         Generates a threat detection report based on the analyzed data.
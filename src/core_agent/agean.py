@@ -1,11 +1,17 @@
-from typing import Any, AsyncIterable, Dict, List, Optional, Tuple
+import os
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional, Tuple
 
 from langchain.agents import AgentExecutor
 from langsmith import LangSmith
 
+from src.core_agent.history import ChatHistoryManager, allm_summarizer, llm_summarizer
+from src.core_agent.scheduler import TaskScheduler, agent_scheduler, task_priority
+from src.db.dedup import EventAggregator
 from src.llm import llm_config, model
 from src.prompts_config import CTIPrompts
 from src.tools import CTITools
+from src.tools.enrichment_cache import EnrichmentCache
+from src.tools.indicator_index import IndicatorIndex
 
 
 class AGEAN:
@@ -13,17 +19,31 @@ class AGEAN:
                  tools: Optional[List] = None, tracing: bool = True, 
                  verbose: bool = False, accumulate_chat_history: bool = True,
                  show_token_usage: bool = False, streaming: bool = True, 
-                 blacklist: Optional[List[str]] = None):
+                 blacklist: Optional[List[str]] = None, history_token_budget: int = 4000,
+                 dedup_window: float = 10.0, dedup_key_fields: Optional[List[str]] = None,
+                 indicator_index_path: Optional[str] = None, cti_cache_ttl: float = 3600.0,
+                 cti_negative_ttl: float = 300.0,
+                 on_aggregate: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
         self.tracing = LangSmith()
         self.__name = name
-        self.__chat_history = []
         self.__llm = llm_config(streaming=streaming)
+        self.__chat_history = ChatHistoryManager(token_budget=history_token_budget,
+                                                 summarizer=llm_summarizer(self.__llm),
+                                                 async_summarizer=allm_summarizer(self.__llm))
         self.__tools = self._get_tools(packages=None, tools=tools, blacklist=blacklist)
         self.__memory_key = "chat_history"
         self.__scratchpad = "agent_scratchpad"
         self.__accumulate_chat_history = accumulate_chat_history
         self.__show_token_usage = show_token_usage if not streaming else False
         self.__verbose = verbose
+        self.__aggregator = EventAggregator(
+            key_fields=dedup_key_fields or ["source.ip", "destination.ip", "event.action"],
+            window=dedup_window, timestamp_field="timestamp", on_emit=on_aggregate)
+        indicator_index_path = indicator_index_path or os.getenv("CTI_INDEX_PATH")
+        self.__indicator_index = IndicatorIndex(indicator_index_path) if indicator_index_path else None
+        self.__cti_cache = EnrichmentCache(CTITools.fetch_threat_intelligence, ttl=cti_cache_ttl,
+                                           negative_ttl=cti_negative_ttl)
+        self.__scheduler: Optional[TaskScheduler] = None
         self.__invoke = invoke()
 
 
@@ -32,8 +52,16 @@ class AGEAN:
         
     @property
     def chat_history(self):
-        """Return chat history."""
-        return self.__chat_history
+        """Return the token-bounded chat history sent with each call."""
+        return self.__chat_history.messages()
+
+    def pin_message(self, content: str):
+        """Keep content (e.g. the incident under investigation) in every call's history."""
+        self.__chat_history.pin(content)
+
+    def history_stats(self) -> Dict[str, Any]:
+        """Chat history size, budget and tokens saved by compaction."""
+        return self.__chat_history.stats()
     
     @property
     def invoke_llm(self, query:List[str]):
@@ -43,7 +71,7 @@ class AGEAN:
         Invoke the agent with a user query and return the response.
         """
         try:
-            result = self.__executor.invoke({"input": query, "chat_history": self.__chat_history})
+            result = self.__executor.invoke({"input": query, "chat_history": self.__chat_history.messages()})
         except Exception as e:
             return f"Error: {e}"
         
@@ -59,7 +87,8 @@ class AGEAN:
         try:
             final_output = ""
             async for event in self.__executor.astream_events(
-                input={"input": query, "chat_history": self.__chat_history}, config={"run_name": "Agent"}):
+                input={"input": query, "chat_history": self.__chat_history.messages()},
+                config={"run_name": "Agent"}):
                 
                 if event["event"] == "on_chat_model_stream":
                     yield {"type": "token", "content": event["data"]["chunk"].content}
@@ -72,7 +101,7 @@ class AGEAN:
                             final_output = chain_output
                             yield {"type": "final", "content": chain_output}
             if final_output:
-                self._record_chat_history(query, final_output)
+                await self._arecord_chat_history(query, final_output)
         except Exception as e:
             yield {"type": "error", "content": f"Error: {e}"}
 
@@ -95,29 +124,54 @@ class AGEAN:
 
     def _record_chat_history(self, query: str, response: str):
         """
-        Record the chat history if accumulation is enabled.
+        Record the chat history if accumulation is enabled. Old turns are
+        summarized once the history exceeds its token budget.
         """
         if self.__accumulate_chat_history:
-            self.__chat_history.extend([{"input": query}, {"response": response}])
+            self.__chat_history.add_turn(query, response)
+
+    async def _arecord_chat_history(self, query: str, response: str):
+        """_record_chat_history for astream; summarization runs without blocking the event loop."""
+        if self.__accumulate_chat_history:
+            await self.__chat_history.aadd_turn(query, response)
 
     def clear_chat(self):
         """Clear the agent's chat history."""
-        self.__chat_history = []
+        self.__chat_history.clear()
 
     def task_handler(self, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
-        Handle individual tasks from a task queue.
+        Take the most urgent task from a task queue: highest severity first,
+        oldest first within a severity, with older tasks aged ahead (see
+        scheduler.priority_key). This scans the list once; for continuous
+        dispatch use dispatch(), which keeps tasks in per-agent heaps.
+        """
+        if not tasks:
+            return {}
+        return tasks.pop(min(range(len(tasks)), key=lambda i: task_priority(tasks[i])))
+
+    async def dispatch(self, agent_type: str, event: Dict[str, Any], severity: Optional[str] = None) -> Any:
+        """
+        Run event on the threat, vulnerability or incident agent through the
+        agents' TaskScheduler (started on first use) and return its result.
+        Severity defaults to event["severity"].
         """
-        return tasks.pop(0) if tasks else {}
+        if self.__scheduler is None:
+            self.__scheduler = agent_scheduler()
+        await self.__scheduler.start()
+        return await self.__scheduler.submit(agent_type, event, severity)
+
+    async def stop_dispatch(self):
+        """Finish dispatched tasks and stop the scheduler's workers."""
+        if self.__scheduler is not None:
+            await self.__scheduler.stop()
 
     def task_prioritize(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Prioritize tasks based on a custom prioritization strategy.
+        Drain a task queue into priority order (same ordering as task_handler).
         """
-        priorities = []
-        while tasks:
-            task = self.task_handler(tasks)
-            priorities.append(task)
+        priorities = sorted(tasks, key=task_priority)
+        tasks.clear()
         return priorities
 
     def map_to_ecs(self, event: Dict[str, Any]) -> Dict[str, Any]:
@@ -135,11 +189,67 @@ class AGEAN:
         }
         return {key: value for key, value in ecs_mapping.items() if value is not None}
 
+    def ingest(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Map raw events to ECS and collapse duplicates (same source IP,
+        destination IP and action by default) within the dedup window.
+        Returns the aggregated events whose window has closed; only these
+        need an agent invocation. Each carries aggregation.count and the
+        first/last timestamps of the events it stands for. Windows that close
+        while no events arrive are handed to on_aggregate by a background
+        timer, or returned by expire_ingest() when polled.
+        """
+        return self.__aggregator.add_many([self.map_to_ecs(event) for event in events])
+
+    def expire_ingest(self) -> List[Dict[str, Any]]:
+        """Emit the aggregates whose dedup window has closed, without new events."""
+        return self.__aggregator.expire()
+
+    def flush_ingest(self) -> List[Dict[str, Any]]:
+        """Emit every aggregate still held in the dedup window."""
+        return self.__aggregator.flush()
+
+    def ingest_stats(self) -> Dict[str, Any]:
+        """Events received, emitted and suppressed by deduplication."""
+        return self.__aggregator.stats()
+
     def fetch_cti_data(self, indicator: str) -> Dict[str, Any]:
         """
         Fetch Cyber Threat Intelligence (CTI) data for a given indicator (IP, domain, file hash).
+        Indicators already in the local indicator index are answered from it without a network call;
+        others go through the enrichment cache, so concurrent lookups of one indicator share a request.
         """
-        return CTITools.fetch_threat_intelligence(indicator)
+        known = self._lookup_indicator_index(indicator)
+        if known is not None:
+            return known
+        return self.__cti_cache.get(indicator)
+
+    def fetch_cti_data_many(self, indicators: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch CTI data for several indicators; cache misses are fetched together as one batch.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for indicator in indicators:
+            known = self._lookup_indicator_index(indicator)
+            if known is not None:
+                results[indicator] = known
+            else:
+                misses.append(indicator)
+        results.update(self.__cti_cache.fetch_many(misses))
+        return results
+
+    def cti_cache_stats(self) -> Dict[str, Any]:
+        """Hit, coalescing and upstream call counts of the CTI enrichment cache."""
+        return self.__cti_cache.stats()
+
+    def _lookup_indicator_index(self, indicator: str) -> Optional[Dict[str, Any]]:
+        if self.__indicator_index is None:
+            return None
+        source = self.__indicator_index.lookup(indicator)
+        if source is None:
+            return None
+        return {"indicator": indicator, "known": True, "source": source or None, "origin": "local_index"}
 
     def execute_playbook(self, playbook: str, incident_data: Dict[str, Any]) -> str:
         """
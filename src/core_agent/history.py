@@ -0,0 +1,220 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (previous summary, turns being folded in, token budget) -> new summary
+Summarizer = Callable[[str, List[Tuple[str, str]], int], str]
+AsyncSummarizer = Callable[[str, List[Tuple[str, str]], int], Awaitable[str]]
+
+SUMMARY_PROMPT = (
+    "Condense the following SOC analyst session into a summary of at most {budget} tokens. "
+    "Keep indicators (IPs, domains, hashes), verdicts, open questions and decisions; drop pleasantries.\n\n"
+    "Summary so far:\n{summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
+)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _truncate_to_tokens(text: str, budget: int, keep: str = "end") -> str:
+    """Deterministically cut text to roughly budget tokens, keeping its start or end."""
+    limit = max(budget, 0) * 4
+    if len(text) <= limit:
+        return text
+    if limit <= 3:
+        return ""
+    return "..." + text[-(limit - 3):] if keep == "end" else text[:limit - 3] + "..."
+
+
+def _format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"User: {query}\nAgent: {response}" for query, response in turns)
+
+
+def llm_summarizer(llm: Any) -> Summarizer:
+    """Summarizer backed by a LangChain chat model (anything with .invoke)."""
+    def summarize(summary: str, turns: List[Tuple[str, str]], budget: int) -> str:
+        prompt = SUMMARY_PROMPT.format(budget=budget, summary=summary or "(none)", turns=_format_turns(turns))
+        result = llm.invoke(prompt)
+        return getattr(result, "content", result)
+    return summarize
+
+
+def allm_summarizer(llm: Any) -> AsyncSummarizer:
+    """Async summarizer backed by a LangChain chat model (.ainvoke), for use on an event loop."""
+    async def summarize(summary: str, turns: List[Tuple[str, str]], budget: int) -> str:
+        prompt = SUMMARY_PROMPT.format(budget=budget, summary=summary or "(none)", turns=_format_turns(turns))
+        result = await llm.ainvoke(prompt)
+        return getattr(result, "content", result)
+    return summarize
+
+
+class ChatHistoryManager:
+    """
+    Token-budgeted chat history for AGEAN agents.
+
+    Turns are kept verbatim while the history fits in token_budget. Past the
+    budget, the oldest unpinned turns are folded into a rolling summary (via
+    summarizer, or deterministic truncation if there is none or it fails)
+    capped at summary_budget tokens. The newest keep_recent turns are always
+    kept verbatim (shortened only if they alone exceed the budget, keeping the
+    start of the query and the end of the response). Pinned messages count
+    against the budget but are never summarized or cut. The context sent per
+    turn therefore stays O(token_budget) however long the session runs.
+    messages() returns entries in the {"input": ...} / {"response": ...} shape
+    the executors already consume.
+
+    Use aadd_turn() from async code: it summarizes with async_summarizer (or
+    the sync summarizer on a worker thread) so the event loop never blocks.
+    """
+
+    def __init__(self, token_budget: int = 4000, summary_budget: Optional[int] = None,
+                 keep_recent: int = 2, summarizer: Optional[Summarizer] = None,
+                 async_summarizer: Optional[AsyncSummarizer] = None,
+                 token_counter: Callable[[str], int] = count_tokens):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget if summary_budget is not None else token_budget // 4
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self.async_summarizer = async_summarizer
+        self.token_counter = token_counter
+        self.clear()
+
+    def clear(self):
+        self._turns: List[Tuple[str, str, int]] = []
+        self._pinned: List[Tuple[Dict[str, Any], int]] = []
+        self._summary = ""
+        self._summary_tokens = 0
+        self._raw_tokens = 0
+        self.counters = {"turns": 0, "summaries": 0, "truncations": 0, "tokens_saved": 0}
+
+    # Recording
+
+    def add_turn(self, query: str, response: str, pinned: bool = False):
+        self._append_turn(query, response, pinned)
+        self._compact()
+        self._count_savings()
+
+    async def aadd_turn(self, query: str, response: str, pinned: bool = False):
+        """add_turn for async callers: summarization does not block the event loop."""
+        self._append_turn(query, response, pinned)
+        folded = self._take_fold()
+        if folded:
+            self._set_summary(await self._asummarize(folded))
+        self._shorten_turns()
+        self._count_savings()
+
+    def _append_turn(self, query: str, response: str, pinned: bool):
+        tokens = self.token_counter(query) + self.token_counter(response)
+        self._raw_tokens += tokens
+        self.counters["turns"] += 1
+        if pinned:
+            self._pinned.append(({"input": query}, self.token_counter(query)))
+            self._pinned.append(({"response": response}, self.token_counter(response)))
+        else:
+            self._turns.append((query, response, tokens))
+
+    def pin(self, content: str, role: str = "input"):
+        """Keep content in every context, e.g. the incident under investigation."""
+        tokens = self.token_counter(content)
+        self._raw_tokens += tokens
+        self._pinned.append(({role: content}, tokens))
+        self._compact()
+
+    def _count_savings(self):
+        # Savings of the context the next call sends, counted once per turn
+        self.counters["tokens_saved"] += self._raw_tokens - self.context_tokens
+
+    # Reading
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """The bounded history to send with the next call."""
+        history = [message for message, _ in self._pinned]
+        if self._summary:
+            history.append({"summary": self._summary})
+        for query, response, _ in self._turns:
+            history.extend([{"input": query}, {"response": response}])
+        return history
+
+    @property
+    def context_tokens(self) -> int:
+        return (sum(tokens for _, tokens in self._pinned) + self._summary_tokens
+                + sum(tokens for _, _, tokens in self._turns))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        tokens_saved is cumulative over recorded turns: what sending the full
+        history after each turn would cost minus the bounded context.
+        """
+        return {**self.counters, "raw_tokens": self._raw_tokens, "context_tokens": self.context_tokens,
+                "token_budget": self.token_budget, "verbatim_turns": len(self._turns),
+                "pinned": len(self._pinned), "summary_tokens": self._summary_tokens}
+
+    # Compaction
+
+    def _compact(self):
+        folded = self._take_fold()
+        if folded:
+            self._set_summary(self._summarize(folded))
+        self._shorten_turns()
+
+    def _take_fold(self) -> List[Tuple[str, str]]:
+        """Remove and return the oldest turns to fold into the summary, if over budget."""
+        if self.context_tokens <= self.token_budget:
+            return []
+        # Fold down to a low watermark (summary at full size, turns within 3/4 of
+        # the budget) so the summarizer runs every few turns, not on every turn
+        target = self.token_budget * 3 // 4 - self.summary_budget - sum(tokens for _, tokens in self._pinned)
+        kept = sum(tokens for _, _, tokens in self._turns)
+        fold = 0
+        while fold < len(self._turns) - self.keep_recent and kept > target:
+            kept -= self._turns[fold][2]
+            fold += 1
+        folded = [(query, response) for query, response, _ in self._turns[:fold]]
+        del self._turns[:fold]
+        return folded
+
+    def _shorten_turns(self):
+        # Still over: the kept turns themselves are too large; shorten them oldest first
+        for position, (query, response, tokens) in enumerate(self._turns):
+            excess = self.context_tokens - self.token_budget
+            if excess <= 0:
+                break
+            allowance = max(tokens - excess, 0)
+            query_tokens, response_tokens = self.token_counter(query), self.token_counter(response)
+            # Share what is left so neither side is cut to nothing while the other stays whole
+            query_allowance = min(query_tokens, max(allowance // 2, allowance - response_tokens))
+            query = _truncate_to_tokens(query, query_allowance, keep="start")
+            response = _truncate_to_tokens(response, allowance - query_allowance, keep="end")
+            self._turns[position] = (query, response, self.token_counter(query) + self.token_counter(response))
+            self.counters["truncations"] += 1
+
+    def _summarize(self, turns: List[Tuple[str, str]]) -> str:
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self._summary, turns, self.summary_budget)
+                self.counters["summaries"] += 1
+                return _truncate_to_tokens(summary, self.summary_budget)
+            except Exception as e:
+                print(f"Chat history summarization failed, truncating instead: {e}")
+        return self._fallback_summary(turns)
+
+    async def _asummarize(self, turns: List[Tuple[str, str]]) -> str:
+        if self.async_summarizer is None:
+            return await asyncio.to_thread(self._summarize, turns)
+        try:
+            summary = await self.async_summarizer(self._summary, turns, self.summary_budget)
+            self.counters["summaries"] += 1
+            return _truncate_to_tokens(summary, self.summary_budget)
+        except Exception as e:
+            print(f"Chat history summarization failed, truncating instead: {e}")
+        return self._fallback_summary(turns)
+
+    def _fallback_summary(self, turns: List[Tuple[str, str]]) -> str:
+        self.counters["truncations"] += 1
+        combined = "\n".join(filter(None, [self._summary, _format_turns(turns)]))
+        return _truncate_to_tokens(combined, self.summary_budget)
+
+    def _set_summary(self, summary: str):
+        self._summary = summary
+        self._summary_tokens = self.token_counter(summary) if summary else 0
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+Handler = Callable[[Dict[str, Any]], Union[Any, Awaitable[Any]]]
+
+# Seconds of age a task must have before it outranks a fresh task of a more
+# urgent severity. Aging is capped at AGING_CAP: critical and high tasks are
+# strictly ordered ahead of everything less severe, and only the severities
+# below them overtake each other with age (a low task outranks a fresh medium
+# one after ~50 minutes), so the low backlog drains without delaying urgent work.
+DEFAULT_SEVERITY_OFFSETS = {"critical": 0.0, "high": 60.0, "medium": 600.0, "low": 3600.0, "info": 7200.0}
+DEFAULT_SEVERITY = "medium"
+AGING_CAP = "high"
+
+PriorityKey = Tuple[float, float]
+
+
+def normalize_severity(severity: Any, offsets: Dict[str, float] = DEFAULT_SEVERITY_OFFSETS) -> str:
+    severity = str(severity or DEFAULT_SEVERITY).lower()
+    return severity if severity in offsets else DEFAULT_SEVERITY
+
+
+def priority_key(severity: Any, enqueued_at: float,
+                 offsets: Dict[str, float] = DEFAULT_SEVERITY_OFFSETS) -> PriorityKey:
+    """
+    Heap key combining severity and age, smallest first: a tier, then enqueue
+    time plus the severity's offset. Severities up to AGING_CAP each get their
+    own tier; the rest share the last one. Because the key is fixed at enqueue
+    time, aging needs no re-heapify: within the shared tier an older task
+    overtakes newer, more severe ones once its age exceeds the difference
+    between their offsets, but it never overtakes a critical or high task.
+    """
+    offset = offsets[normalize_severity(severity, offsets)]
+    tier = offset if offset <= offsets.get(AGING_CAP, 0.0) else math.inf
+    return tier, enqueued_at + offset
+
+
+def task_priority(task: Dict[str, Any], offsets: Dict[str, float] = DEFAULT_SEVERITY_OFFSETS) -> PriorityKey:
+    """
+    priority_key for an AGEAN task dict ({"severity": ..., "enqueued_at": epoch
+    seconds}); a task without enqueued_at counts as enqueued now.
+    """
+    enqueued_at = task.get("enqueued_at")
+    return priority_key(task.get("severity"), time.time() if enqueued_at is None else float(enqueued_at), offsets)
+
+
+class _Scheduled:
+    __slots__ = ("key", "seq", "severity", "payload", "enqueued_at", "future")
+
+    def __init__(self, key: PriorityKey, seq: int, severity: str, payload: Dict[str, Any], enqueued_at: float,
+                 future: "asyncio.Future[Any]"):
+        self.key = key
+        self.seq = seq
+        self.severity = severity
+        self.payload = payload
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+    def __lt__(self, other: "_Scheduled") -> bool:
+        return (self.key, self.seq) < (other.key, other.seq)
+
+
+class _AgentQueue:
+    """Heap of pending tasks for one agent type plus the workers draining it."""
+
+    def __init__(self, handler: Handler, concurrency: int):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.heap: List[_Scheduled] = []
+        self.ready = asyncio.Semaphore(0)
+        self.running = 0
+        self.workers: List["asyncio.Task[None]"] = []
+
+
+class TaskScheduler:
+    """
+    Priority scheduler and asyncio worker pool for agent tasks.
+
+    Each agent type (e.g. "incident", "threat", "vulnerability") has its own
+    heap and exactly `concurrency[agent_type]` workers, so a backlog of
+    low-severity scans can neither delay the incident queue nor use its
+    capacity. Within a queue, tasks are ordered by priority_key (severity,
+    then age, with aging capped below high). Handlers may be coroutine functions or plain
+    functions; plain ones run on a thread so synchronous agents don't block
+    the loop. submit() returns a future for the handler's result.
+    metrics() reports queue depth, running tasks and wait times per severity.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], concurrency: Union[int, Dict[str, int]] = 4,
+                 severity_offsets: Optional[Dict[str, float]] = None, wait_samples: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.offsets = dict(severity_offsets or DEFAULT_SEVERITY_OFFSETS)
+        self.clock = clock
+        limits = concurrency if isinstance(concurrency, dict) else {name: concurrency for name in handlers}
+        self._queues = {name: _AgentQueue(handler, limits.get(name, 1)) for name, handler in handlers.items()}
+        self._seq = itertools.count()
+        self._waits: Dict[str, Deque[float]] = {severity: deque(maxlen=wait_samples) for severity in self.offsets}
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        self._started = False
+
+    # Lifecycle
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        for name, queue in self._queues.items():
+            queue.workers = [asyncio.ensure_future(self._worker(name, queue)) for _ in range(queue.concurrency)]
+
+    async def stop(self, drain: bool = True):
+        """
+        Stop the workers, after finishing queued tasks if drain is set and
+        workers are running; pending futures are cancelled.
+        """
+        if drain:
+            # Without workers (never started, or already stopped) nothing would ever drain the heaps
+            while any((queue.heap or queue.running) and queue.workers for queue in self._queues.values()):
+                await asyncio.sleep(0.01)
+        for queue in self._queues.values():
+            for worker in queue.workers:
+                worker.cancel()
+            await asyncio.gather(*queue.workers, return_exceptions=True)
+            queue.workers = []
+            for item in queue.heap:
+                item.future.cancel()
+                self.counters["cancelled"] += 1
+            queue.heap.clear()
+        self._started = False
+
+    async def __aenter__(self) -> "TaskScheduler":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    # Submission
+
+    def submit(self, agent_type: str, payload: Dict[str, Any], severity: Any = None) -> "asyncio.Future[Any]":
+        """Queue payload for the agent type's handler; severity defaults to payload["severity"]."""
+        queue = self._queues.get(agent_type)
+        if queue is None:
+            raise ValueError(f"No handler registered for agent type {agent_type}")
+        severity = normalize_severity(severity if severity is not None else payload.get("severity"), self.offsets)
+        now = self.clock()
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.heap, _Scheduled(priority_key(severity, now, self.offsets), next(self._seq),
+                                              severity, payload, now, future))
+        queue.ready.release()
+        self.counters["submitted"] += 1
+        return future
+
+    # Workers
+
+    async def _worker(self, name: str, queue: _AgentQueue):
+        while True:
+            await queue.ready.acquire()
+            item = heapq.heappop(queue.heap)
+            if item.future.cancelled():
+                self.counters["cancelled"] += 1
+                continue
+            self._waits[item.severity].append(self.clock() - item.enqueued_at)
+            queue.running += 1
+            try:
+                if inspect.iscoroutinefunction(queue.handler):
+                    result = await queue.handler(item.payload)
+                else:
+                    result = await asyncio.to_thread(queue.handler, item.payload)
+            except asyncio.CancelledError:
+                item.future.cancel()
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                self.counters["completed"] += 1
+                if not item.future.done():
+                    item.future.set_result(result)
+            finally:
+                queue.running -= 1
+
+    # Metrics
+
+    def metrics(self) -> Dict[str, Any]:
+        queues = {name: {"depth": len(queue.heap), "running": queue.running, "concurrency": queue.concurrency,
+                         "oldest_wait": (self.clock() - min(item.enqueued_at for item in queue.heap)
+                                         if queue.heap else 0.0)}
+                  for name, queue in self._queues.items()}
+        waits = {}
+        for severity, samples in self._waits.items():
+            if samples:
+                ordered = sorted(samples)
+                waits[severity] = {"count": len(ordered), "p50": ordered[len(ordered) // 2],
+                                   "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                                   "max": ordered[-1]}
+        return {**self.counters, "queues": queues, "wait_seconds": waits}
+
+
+def agent_scheduler(concurrency: Union[int, Dict[str, int]] = 1, **agents) -> TaskScheduler:
+    """
+    TaskScheduler over the analysis agents (agent types "threat",
+    "vulnerability" and "incident"), using graph_parallel.agent_branches for
+    the handlers; agents not passed in are created with their defaults.
+    agent_branches runs one event at a time per agent, hence one worker per
+    agent type by default.
+    """
+    from src.graph_parallel import agent_branches
+    return TaskScheduler(agent_branches(**agents), concurrency=concurrency)
@@ -0,0 +1,404 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple, SerializerProtocol,
+                                       get_checkpoint_id, get_checkpoint_metadata)
+
+from pySQLite_cmds import SQLite3Database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    base_version TEXT,
+    type TEXT,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+BlobKey = Tuple[str, str, str]
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer on SQLite3Database, so a plan-execute thread can
+    resume after a crash or restart without re-running finished steps.
+
+    Storage is incremental:
+      - a checkpoint row holds only channel versions and bookkeeping, not
+        channel values;
+      - a channel's value is written only when its version changes
+        (new_versions), so untouched channels cost nothing per step;
+      - a list channel that only grew (e.g. past_steps with operator.add)
+        stores just the appended items plus a pointer to the previous
+        version, with a full copy every snapshot_every versions to bound the
+        chain a read has to follow;
+      - node outputs arrive through put_writes as they complete, so a
+        superstep interrupted halfway keeps its finished tasks.
+
+    The database runs in WAL mode and writes are committed in batches: every
+    commit_every statements, and by a background thread at most
+    commit_interval seconds after the last write, so the end of a run is
+    committed even when no further checkpoints follow (and on flush/close).
+    A crash loses at most the uncommitted batch, i.e. those steps run again.
+    The last value of each list channel is kept in memory for diffing for at
+    most max_threads recently written threads; a thread evicted from that LRU
+    just writes a full copy on its next checkpoint.
+
+    To resume, invoke the compiled graph with the same thread_id and None as
+    input: LangGraph loads the latest checkpoint plus its pending writes and
+    continues from the last completed node.
+    """
+
+    def __init__(self, db: Union[SQLite3Database, str], commit_every: int = 50, commit_interval: float = 1.0,
+                 snapshot_every: int = 32, max_threads: int = 1000, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=serde)
+        if isinstance(db, str):
+            db = SQLite3Database(db, check_same_thread=False)
+        if db.conn is None:
+            db.connect()
+        self.db = db
+        self.conn = db.conn
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.max_threads = max_threads
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        # Latest stored (version, value, delta depth) per (namespace, channel), by thread in LRU order,
+        # to diff list channels against
+        self._latest: "OrderedDict[str, Dict[Tuple[str, str], Tuple[str, Any, int]]]" = OrderedDict()
+        self.counters = {"checkpoints": 0, "blobs": 0, "delta_blobs": 0, "writes": 0, "commits": 0,
+                         "bytes_written": 0}
+
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+        self._closed = threading.Event()
+        self._committer = threading.Thread(target=self._commit_loop, name="checkpoint-commit", daemon=True)
+        self._committer.start()
+
+    # Commit batching
+
+    def _written(self, statements: int):
+        self._pending += statements
+        if (self._pending >= self.commit_every
+                or time.monotonic() - self._last_commit >= self.commit_interval):
+            self._commit()
+
+    def _commit(self):
+        if self._pending:
+            self.conn.commit()
+            self.counters["commits"] += 1
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def _commit_loop(self):
+        # Commit the tail of a run that stops writing before commit_every is reached
+        while not self._closed.wait(self.commit_interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_commit >= self.commit_interval:
+                    self._commit()
+
+    def flush(self):
+        """Commit everything written so far."""
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self._closed.set()
+        self._committer.join()
+        self.flush()
+        self.db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "uncommitted": self._pending}
+
+    # Channel values
+
+    def _thread_latest(self, thread_id: str) -> Dict[Tuple[str, str], Tuple[str, Any, int]]:
+        latest = self._latest.get(thread_id)
+        if latest is None:
+            latest = self._latest[thread_id] = {}
+            if len(self._latest) > self.max_threads:
+                self._latest.popitem(last=False)
+        else:
+            self._latest.move_to_end(thread_id)
+        return latest
+
+    def _dump_blob(self, key: BlobKey, version: str, value: Any) -> Tuple[Optional[str], str, bytes]:
+        """(base_version, type, blob): a delta against the latest version when the value only grew."""
+        thread_latest = self._thread_latest(key[0])
+        latest = thread_latest.get(key[1:])
+        if (latest is not None and isinstance(value, list) and isinstance(latest[1], list)
+                and latest[2] < self.snapshot_every and len(value) >= len(latest[1])
+                and value[:len(latest[1])] == latest[1]):
+            base_version, previous, depth = latest
+            type_, blob = self.serde.dumps_typed(value[len(previous):])
+            thread_latest[key[1:]] = (version, list(value), depth + 1)
+            self.counters["delta_blobs"] += 1
+            return base_version, type_, blob
+        type_, blob = self.serde.dumps_typed(value)
+        if isinstance(value, list):
+            thread_latest[key[1:]] = (version, list(value), 0)
+        else:
+            thread_latest.pop(key[1:], None)
+        return None, type_, blob
+
+    def _load_blob(self, key: BlobKey, version: str) -> Tuple[bool, Any]:
+        """(found, value) for a channel version, following delta chains back to a full copy."""
+        chain: List[Tuple[str, bytes]] = []
+        current: Optional[str] = version
+        while current is not None:
+            row = self.conn.execute(
+                "SELECT base_version, type, blob FROM checkpoint_blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (*key, current)).fetchone()
+            if row is None:
+                return False, None
+            current = row[0]
+            chain.append((row[1], row[2]))
+        base_type, base_blob = chain.pop()
+        if base_type == "empty":
+            return False, None
+        value = self.serde.loads_typed((base_type, base_blob))
+        for type_, blob in reversed(chain):
+            value = value + self.serde.loads_typed((type_, blob))
+        return True, value
+
+    def _load_channel_values(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for channel, version in versions.items():
+            found, value = self._load_blob((thread_id, checkpoint_ns, channel), str(version))
+            if found:
+                values[channel] = value
+        return values
+
+    # BaseCheckpointSaver
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values: Dict[str, Any] = stored.pop("channel_values")
+        with self._lock:
+            rows = []
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel)
+                if channel in values:
+                    base_version, type_, blob = self._dump_blob(key, str(version), values[channel])
+                else:
+                    base_version, type_, blob = None, "empty", b""
+                rows.append((*key, str(version), base_version, type_, blob))
+                self.counters["bytes_written"] += len(blob)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs "
+                "(thread_id, checkpoint_ns, channel, version, base_version, type, blob) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            # Both are plain dicts, so they share one serializer type tag
+            type_, blob = self.serde.dumps_typed(stored)
+            _, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, blob, metadata_blob))
+            self.counters["checkpoints"] += 1
+            self.counters["blobs"] += len(rows)
+            self.counters["bytes_written"] += len(blob) + len(metadata_blob)
+            self._written(len(rows) + 1)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, type_, blob, task_path))
+        # Special writes (errors, interrupts) replace earlier ones; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(write[0] in WRITES_IDX_MAP for write in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self.conn.executemany(
+                f"{verb} INTO checkpoint_writes "
+                "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            self.counters["writes"] += len(rows)
+            self.counters["bytes_written"] += sum(len(row[7]) for row in rows)
+            self._written(len(rows))
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = ("SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata FROM checkpoints "
+                 "WHERE thread_id = ? AND checkpoint_ns = ?")
+        params: Tuple = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            return self._tuple(thread_id, checkpoint_ns, *row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before is not None and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata "
+                 "FROM checkpoints")
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[2], row[4]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                item = self._tuple(thread_id, checkpoint_ns, *row)
+            yield item
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._latest.pop(thread_id, None)
+            self._written(3)
+            self._commit()
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, parent_checkpoint_id: Optional[str],
+               type_: str, checkpoint_blob: bytes, metadata_blob: bytes) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        checkpoint = {**checkpoint, "channel_values": self._load_channel_values(
+            thread_id, checkpoint_ns, checkpoint["channel_versions"])}
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+
+        def config_for(checkpoint_id: str) -> RunnableConfig:
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=config_for(checkpoint_id),
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((type_, metadata_blob)),
+            parent_config=config_for(parent_checkpoint_id) if parent_checkpoint_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, channel, value_type, value in writes],
+        )
+
+    # Async variants run inline: SQLite calls are short and the connection is shared
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Zero-padded so versions (and the blob primary key) sort in write order
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+_default_saver: Optional[SQLiteCheckpointSaver] = None
+_default_saver_lock = threading.Lock()
+
+
+def get_checkpointer() -> SQLiteCheckpointSaver:
+    """
+    Return the process-wide checkpointer, created on first use at CHECKPOINT_DB
+    (default checkpoints.db).
+    """
+    global _default_saver
+    with _default_saver_lock:
+        if _default_saver is None:
+            _default_saver = SQLiteCheckpointSaver(os.getenv("CHECKPOINT_DB", "checkpoints.db"))
+        return _default_saver
@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.utils.ecs_fields import make_accessor
+
+DEFAULT_KEY_FIELDS = ("source.ip", "destination.ip", "event.action")
+
+
+class _Window:
+    __slots__ = ("event", "count", "first_timestamp", "last_timestamp", "closes_at")
+
+    def __init__(self, event: Dict[str, Any], timestamp: Any, closes_at: float):
+        self.event = event
+        self.count = 1
+        self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        self.closes_at = closes_at
+
+
+class EventAggregator:
+    """
+    Time-windowed deduplication of ECS events.
+
+    Events with the same values for key_fields inside one window collapse into
+    a single aggregated event: the first event of the window plus an
+    "aggregation" object with count, first_timestamp, last_timestamp and the
+    key. A window opens on the first event for a key and closes `window`
+    seconds later, when its aggregate is emitted. Open windows live in an
+    insertion-ordered table, so expiry only touches windows that are due.
+    The table holds at most max_keys windows; past that, the oldest window is
+    emitted early. Downstream volume therefore tracks unique activity per
+    window instead of the raw event count. Events with none of the key fields
+    (e.g. file or process events) are not deduplicated and are emitted
+    straight away with a count of 1.
+
+    add_many() only returns windows that closed before it was called, so with
+    on_emit set a background thread also expires windows every
+    expire_interval seconds (window / 2 by default) and hands them to on_emit;
+    a lone alert then goes out once its window closes even if no further
+    events arrive. close() stops the thread and flushes what is left.
+    """
+
+    def __init__(self, key_fields: Sequence[str] = DEFAULT_KEY_FIELDS, window: float = 10.0,
+                 max_keys: int = 100000, timestamp_field: str = "@timestamp",
+                 on_emit: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 expire_interval: Optional[float] = None):
+        self.key_fields = tuple(key_fields)
+        self.window = window
+        self.max_keys = max_keys
+        self.timestamp_field = timestamp_field
+        self.on_emit = on_emit
+        self.expire_interval = expire_interval or window / 2
+        self._accessors = [make_accessor(field) for field in self.key_fields]
+        self._timestamp = make_accessor(timestamp_field)
+        self._open: "OrderedDict[Tuple[Any, ...], _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"received": 0, "emitted": 0, "suppressed": 0, "evicted": 0, "unkeyed": 0}
+        self._closed = threading.Event()
+        self._expirer: Optional[threading.Thread] = None
+        if on_emit is not None:
+            self._expirer = threading.Thread(target=self._expire_loop, name="dedup-expire", daemon=True)
+            self._expirer.start()
+
+    def key(self, event: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(get(event) for get in self._accessors)
+
+    def add(self, event: Dict[str, Any], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Add one event; returns the aggregates of any windows that closed."""
+        return self.add_many([event], now)
+
+    def add_many(self, events: List[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Add events; returns the aggregates of any windows that closed."""
+        now = time.monotonic() if now is None else now
+        emitted: List[Dict[str, Any]] = []
+        ingest_time = None
+        with self._lock:
+            self._expire(now, emitted)
+            for event in events:
+                self.counters["received"] += 1
+                key = self.key(event)
+                timestamp = self._timestamp(event)
+                if timestamp is None:
+                    # Events without their own timestamp share one ingest timestamp per batch
+                    ingest_time = ingest_time or datetime.utcnow().isoformat()
+                    timestamp = ingest_time
+                if all(value is None for value in key):
+                    # Nothing to deduplicate on: pass the event through on its own
+                    self.counters["unkeyed"] += 1
+                    emitted.append(self._emit(key, _Window(event, timestamp, now)))
+                    continue
+                current = self._open.get(key)
+                if current is not None:
+                    current.count += 1
+                    current.last_timestamp = timestamp
+                    self.counters["suppressed"] += 1
+                    continue
+                self._open[key] = _Window(event, timestamp, now + self.window)
+                if len(self._open) > self.max_keys:
+                    self.counters["evicted"] += 1
+                    emitted.append(self._emit(*self._open.popitem(last=False)))
+        return emitted
+
+    def expire(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Emit aggregates for windows that have closed by now."""
+        emitted: List[Dict[str, Any]] = []
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now, emitted)
+        return emitted
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Emit every open window, e.g. at shutdown."""
+        with self._lock:
+            emitted = [self._emit(key, window) for key, window in self._open.items()]
+            self._open.clear()
+        return emitted
+
+    def close(self):
+        """Stop the expiry thread and hand every open window to on_emit."""
+        self._closed.set()
+        if self._expirer is not None:
+            self._expirer.join()
+        emitted = self.flush()
+        if emitted and self.on_emit is not None:
+            self.on_emit(emitted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            received = self.counters["received"]
+            return {**self.counters, "open_windows": len(self._open),
+                    "reduction": self.counters["suppressed"] / received if received else 0.0}
+
+    def _expire_loop(self):
+        while not self._closed.wait(self.expire_interval):
+            emitted = self.expire()
+            if emitted:
+                try:
+                    self.on_emit(emitted)
+                except Exception as e:
+                    print(f"Error handling {len(emitted)} expired aggregates: {e}")
+
+    def _expire(self, now: float, emitted: List[Dict[str, Any]]):
+        # Windows all last self.window, so insertion order is closing order
+        while self._open:
+            key, window = next(iter(self._open.items()))
+            if window.closes_at > now:
+                break
+            del self._open[key]
+            emitted.append(self._emit(key, window))
+
+    def _emit(self, key: Tuple[Any, ...], window: _Window) -> Dict[str, Any]:
+        self.counters["emitted"] += 1
+        event = copy.copy(window.event)
+        event["aggregation"] = {
+            "count": window.count,
+            "first_timestamp": window.first_timestamp,
+            "last_timestamp": window.last_timestamp,
+            "key": dict(zip(self.key_fields, key)),
+        }
+        return event
@@ -1,64 +1,484 @@
+import asyncio
+import hashlib
 import json
+import os
+import threading
+import time
+import weakref
 from datetime import datetime
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
+import aiohttp
 import requests
 
+from spool import DiskSpool
 
-class ECSMapper:
-    def __init__(self, mapping_file: str):
-        with open(mapping_file, 'r') as f:
-            self.mapping = json.load(f)
+Transform = Callable[[Any], Any]
+Accessor = Callable[[Dict[str, Any]], Any]
+Setter = Callable[[Dict[str, Any]], Dict[str, Any]]
+Leaf = Tuple[str, str, Optional[Transform]]
 
-    def map_to_ecs(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        ecs_event = {}
-        for ecs_field, source_field in self.mapping.items():
+_TRANSFORMS: Dict[str, Transform] = {
+    'uppercase': lambda value: value.upper() if value else None,
+    'lowercase': lambda value: value.lower() if value else None,
+}
+
+
+def _make_accessor(source: str, transform: Optional[Transform]) -> Accessor:
+    if transform is None:
+        def accessor(payload: Dict[str, Any]) -> Any:
+            return payload.get(source)
+    else:
+        def accessor(payload: Dict[str, Any]) -> Any:
+            return transform(payload.get(source))
+    return accessor
+
+
+def _make_parent_setter(parent: Tuple[str, ...]) -> Setter:
+    """Return a closure that creates (if needed) and returns the parent object of a nested ECS path."""
+    if not parent:
+        return lambda event: event
+
+    def setter(event: Dict[str, Any]) -> Dict[str, Any]:
+        node = event
+        for part in parent:
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+        return node
+    return setter
+
+
+class MappingPlan:
+    """
+    An immutable, compiled form of an ECS mapping file.
+
+    Each source field becomes an accessor closure with its transform bound in
+    (used for columnar output; row output inlines the same lookup), and fields
+    are grouped by parent object behind a nested-path setter closure, so
+    applying the plan does no string parsing or interpretation of the mapping.
+    Plans are shared between mappers through a cache keyed by content hash.
+    """
+    __slots__ = ('digest', 'mapping', 'fields', 'groups', '__weakref__')
+
+    def __init__(self, mapping: Dict[str, Any], digest: str = ''):
+        fields: List[Tuple[str, Accessor]] = []
+        groups: Dict[Tuple[str, ...], List[Leaf]] = {}
+        for ecs_field, source_field in mapping.items():
             if isinstance(source_field, str):
-                value = payload.get(source_field)
+                source, transform = source_field, None
             elif isinstance(source_field, dict):
-                value = self._apply_custom_mapping(payload, source_field)
+                transform = _TRANSFORMS.get(source_field.get('transform'))
+                if 'field' not in source_field or transform is None:
+                    # Custom mappings without a known transform never yield a value
+                    continue
+                source = source_field['field']
             else:
                 continue
+            accessor = _make_accessor(source, transform)
+            path = tuple(ecs_field.split('.'))
+            fields.append((ecs_field, accessor))
+            groups.setdefault(path[:-1], []).append((path[-1], source, transform))
 
-            if value is not None:
-                self._set_nested_field(ecs_event, ecs_field, value)
+        self.digest = digest
+        self.mapping: Mapping[str, Any] = MappingProxyType(dict(mapping))
+        self.fields: Tuple[Tuple[str, Accessor], ...] = tuple(fields)
+        self.groups: Tuple[Tuple[Setter, Tuple[Leaf, ...]], ...] = tuple(
+            (_make_parent_setter(parent), tuple(leaves)) for parent, leaves in groups.items()
+        )
 
-        if '@timestamp' not in ecs_event:
-            ecs_event['@timestamp'] = datetime.utcnow().isoformat()
+    def __setattr__(self, name: str, value: Any):
+        if hasattr(self, name):
+            raise AttributeError(f"MappingPlan is immutable: cannot reassign '{name}'")
+        object.__setattr__(self, name, value)
 
+    def apply(self, payload: Dict[str, Any], timestamp: str) -> Dict[str, Any]:
+        ecs_event: Dict[str, Any] = {}
+        get = payload.get
+        for parent_setter, leaves in self.groups:
+            node = None
+            for leaf, source, transform in leaves:
+                # Inlined accessor: one call per field matters at ingest rates
+                value = get(source)
+                if transform is not None:
+                    value = transform(value)
+                if value is None:
+                    continue
+                if node is None:
+                    node = parent_setter(ecs_event)
+                node[leaf] = value
+        if '@timestamp' not in ecs_event:
+            ecs_event['@timestamp'] = timestamp
         return ecs_event
 
-    def _apply_custom_mapping(self, payload: Dict[str, Any], mapping: Dict[str, Any]) -> Any:
-        if 'field' in mapping:
-            value = payload.get(mapping['field'])
-            if 'transform' in mapping:
-                if mapping['transform'] == 'uppercase':
-                    return value.upper() if value else None
-                elif mapping['transform'] == 'lowercase':
-                    return value.lower() if value else None
-        return None
+    def apply_columnar(self, payloads: List[Dict[str, Any]], timestamp: str) -> Dict[str, List[Any]]:
+        columns: Dict[str, List[Any]] = {}
+        for ecs_field, accessor in self.fields:
+            columns[ecs_field] = [accessor(payload) for payload in payloads]
+        stamps = columns.get('@timestamp')
+        if stamps is None:
+            columns['@timestamp'] = [timestamp] * len(payloads)
+        else:
+            columns['@timestamp'] = [timestamp if value is None else value for value in stamps]
+        return columns
+
+
+_PLAN_CACHE: 'weakref.WeakValueDictionary[str, MappingPlan]' = weakref.WeakValueDictionary()
+_PLAN_CACHE_LOCK = threading.Lock()
 
-    def _set_nested_field(self, obj: Dict[str, Any], field: str, value: Any):
-        parts = field.split('.')
-        for part in parts[:-1]:
-            if part not in obj:
-                obj[part] = {}
-            obj = obj[part]
-        obj[parts[-1]] = value
 
+def load_plan(raw: bytes) -> MappingPlan:
+    """
+    Return the compiled plan for raw mapping JSON, compiling it only if no
+    live plan with the same content hash exists.
+    """
+    digest = hashlib.sha256(raw).hexdigest()
+    with _PLAN_CACHE_LOCK:
+        plan = _PLAN_CACHE.get(digest)
+        if plan is None:
+            plan = MappingPlan(json.loads(raw), digest)
+            _PLAN_CACHE[digest] = plan
+    return plan
+
+
+class ECSMapper:
+    def __init__(self, mapping_file: str, reload_interval: Optional[float] = 1.0):
+        """
+        Args:
+            mapping_file: Path to the ECS mapping JSON.
+            reload_interval: Seconds between checks of the mapping file for
+                changes; None disables hot reload.
+        """
+        self.mapping_file = mapping_file
+        self.reload_interval = reload_interval
+        self._file_stat: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._plan = self._load()
+
+    @property
+    def plan(self) -> MappingPlan:
+        if self.reload_interval is not None and time.monotonic() >= self._next_check:
+            self.reload()
+        return self._plan
+
+    @property
+    def mapping(self) -> Mapping[str, Any]:
+        return self._plan.mapping
+
+    def _load(self) -> MappingPlan:
+        st = os.stat(self.mapping_file)
+        with open(self.mapping_file, 'rb') as f:
+            raw = f.read()
+        self._file_stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+        return load_plan(raw)
+
+    def reload(self) -> bool:
+        """
+        Swap in a new plan if the mapping file changed on disk. Returns True
+        when the active plan was replaced. A file that fails to parse (e.g.
+        mid-write) keeps the current plan until the next check.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.reload_interval is not None:
+                self._next_check = time.monotonic() + self.reload_interval
+            try:
+                st = os.stat(self.mapping_file)
+                if (st.st_mtime_ns, st.st_size, st.st_ino) == self._file_stat:
+                    return False
+                plan = self._load()
+            except (OSError, ValueError) as e:
+                print(f"Error reloading ECS mapping {self.mapping_file}: {e}")
+                return False
+            if plan is self._plan:
+                return False
+            self._plan = plan
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def map_to_ecs(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self.plan.apply(payload, datetime.utcnow().isoformat())
+
+    def map_batch(self, payloads: List[Dict[str, Any]],
+                  columnar: bool = False) -> Union[List[Dict[str, Any]], Dict[str, List[Any]]]:
+        """
+        Map many payloads with the compiled plan.
+
+        Returns a list of ECS events (same shape as map_to_ecs), or with
+        columnar=True a dict of dotted ECS field -> list of values aligned with
+        payloads (None where the source was missing). Events without a source
+        timestamp share one ingest '@timestamp' for the whole batch.
+        """
+        plan = self.plan
+        timestamp = datetime.utcnow().isoformat()
+        if columnar:
+            return plan.apply_columnar(payloads, timestamp)
+        apply = plan.apply
+        return [apply(payload, timestamp) for payload in payloads]
 
 
 class LogstashSender:
-    def __init__(self, logstash_url: str):
+    def __init__(self, logstash_url: str, spool: Optional[DiskSpool] = None,
+                 replay_interval: float = 5.0, replay_rate: Optional[float] = 1000.0):
+        """
+        Args:
+            logstash_url: Logstash HTTP input URL.
+            spool: Optional DiskSpool. When set, events that cannot be delivered
+                (and every event after them, to keep order) are spooled to disk
+                and replayed by a background thread once Logstash is back.
+            replay_interval: Seconds between delivery attempts while spooling.
+            replay_rate: Max replayed events/sec; must exceed the live ingest
+                rate for the spool to catch up.
+        """
         self.logstash_url = logstash_url
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self.replay_rate = replay_rate
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._replayer: Optional[threading.Thread] = None
+        if spool is not None:
+            self._replayer = threading.Thread(target=self._replay_worker, name="logstash-replay", daemon=True)
+            self._replayer.start()
 
     def send(self, event: Dict[str, Any]):
+        if self.spool is not None and self.spool.pending:
+            self.spool.append(event)
+            return
         try:
             response = requests.post(self.logstash_url, json=event)
             response.raise_for_status()
             print(f"Event sent successfully: {event.get('@timestamp', 'N/A')}")
         except requests.exceptions.RequestException as e:
             print(f"Error sending event to Logstash: {e}")
+            if self.spool is not None:
+                self.spool.append(event)
+
+    def close(self):
+        self._stop.set()
+        if self._replayer is not None:
+            self._replayer.join()
+            self.spool.flush()
+        self._session.close()
+
+    def _send_batch(self, events: List[Dict[str, Any]]) -> bool:
+        # Delivery is at-least-once: a batch that fails part-way is replayed whole
+        try:
+            for event in events:
+                response = self._session.post(self.logstash_url, json=event)
+                response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"Logstash still unavailable, keeping events spooled: {e}")
+            return False
+
+    def _replay_worker(self):
+        while not self._stop.wait(self.replay_interval):
+            if self.spool.pending:
+                replayed = self.spool.replay(self._send_batch, batch_size=100,
+                                             max_events_per_sec=self.replay_rate, stop=self._stop)
+                if replayed:
+                    print(f"Replayed {replayed} spooled events to Logstash")
+
+
+
+class AsyncLogstashSender:
+    """
+    Batched, pooled asyncio sender for the Logstash HTTP input.
+
+    Events are queued in a bounded in-memory queue and flushed as one
+    newline-delimited JSON body when batch_size events are buffered or
+    linger seconds pass, over a keep-alive connection pool. At most
+    max_in_flight bulk requests run at once; when they are all busy the queue
+    fills and send() blocks, which is the backpressure signal to producers.
+
+    With a DiskSpool, batches that fail to deliver are written to disk and
+    every batch formed after that follows them there until a background task
+    has replayed the spool in order (at most replay_rate events/sec), so an
+    outage never drops events or blocks producers beyond the spool's append
+    cost. Batches already in flight when a request fails may still be
+    delivered (or spooled) ahead of it, so strict ordering across an outage
+    needs max_in_flight=1.
+
+    The Logstash pipeline must decode NDJSON bodies, e.g.
+    additional_codecs => { "application/x-ndjson" => "json_lines" }.
+    """
+
+    def __init__(self, logstash_url: str, batch_size: int = 500, linger: float = 0.05,
+                 queue_size: int = 10000, max_in_flight: int = 4, pool_size: int = 8,
+                 timeout: float = 10.0, spool: Optional[DiskSpool] = None,
+                 replay_interval: float = 5.0, replay_rate: Optional[float] = 20000.0):
+        self.logstash_url = logstash_url
+        self.batch_size = batch_size
+        self.linger = linger
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self.replay_rate = replay_rate
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "batches": 0, "spooled": 0, "replayed": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._replayer: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._posts: set = set()
+
+    async def start(self):
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        self._batcher = asyncio.create_task(self._run())
+        if self.spool is not None:
+            self._replayer = asyncio.create_task(self._replay())
+
+    async def send(self, event: Dict[str, Any]):
+        """Queue an event, waiting while the queue is full."""
+        if self._batcher is None:
+            await self.start()
+        await self._queue.put(event)
+        self.stats["queued"] += 1
+
+    async def close(self):
+        """Flush everything queued, wait for in-flight requests and close the pool."""
+        if self._batcher is None:
+            return
+        joined = asyncio.ensure_future(self._queue.join())
+        await asyncio.wait({joined, self._batcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not joined.done():
+            # The batcher died, so nothing will drain the queue: keep what is left
+            joined.cancel()
+            if not self._batcher.cancelled() and self._batcher.exception() is not None:
+                print(f"Logstash batcher failed: {self._batcher.exception()}")
+            await self._drain_queue()
+        for task in (self._batcher, self._replayer):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        if self._posts:
+            await asyncio.gather(*self._posts, return_exceptions=True)
+        if self.spool is not None:
+            await asyncio.to_thread(self.spool.flush)
+        await self._session.close()
+        self._batcher = self._replayer = None
+
+    async def __aenter__(self) -> "AsyncLogstashSender":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if self.spool is not None and self.spool.pending:
+                # Keep order behind events still waiting in the spool
+                await self._spool(batch)
+                self._done(batch)
+                continue
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._post(batch))
+            self._posts.add(task)
+            task.add_done_callback(self._posts.discard)
+
+    async def _post(self, batch: List[Dict[str, Any]]):
+        try:
+            if not await self._deliver(batch):
+                if self.spool is not None:
+                    await self._spool(batch)
+                else:
+                    self.stats["failed"] += len(batch)
+        finally:
+            self._in_flight.release()
+            self._done(batch)
+
+    async def _deliver(self, batch: List[Dict[str, Any]]) -> bool:
+        body = "".join(json.dumps(event) + "\n" for event in batch).encode()
+        try:
+            async with self._session.post(self.logstash_url, data=body) as response:
+                response.raise_for_status()
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error sending {len(batch)} events to Logstash: {e}")
+            return False
+        self.stats["sent"] += len(batch)
+        self.stats["batches"] += 1
+        return True
+
+    async def _spool(self, batch: List[Dict[str, Any]]):
+        await asyncio.to_thread(self.spool.append_many, batch)
+        self.stats["spooled"] += len(batch)
+
+    async def _drain_queue(self):
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            if self.spool is not None:
+                await self._spool(batch)
+            else:
+                print(f"Dropping {len(batch)} queued events: Logstash batcher is not running")
+                self.stats["failed"] += len(batch)
+            self._done(batch)
+
+    def _done(self, batch: List[Dict[str, Any]]):
+        for _ in batch:
+            self._queue.task_done()
+
+    async def _replay(self):
+        started, replayed = time.monotonic(), 0
+        while True:
+            if not self.spool.pending:
+                started, replayed = time.monotonic(), 0
+                await asyncio.sleep(self.replay_interval)
+                continue
+            events, position = await asyncio.to_thread(self.spool.read, self.batch_size)
+            if events and not await self._deliver(events):
+                await asyncio.sleep(self.replay_interval)
+                continue
+            await asyncio.to_thread(self.spool.ack, position)
+            replayed += len(events)
+            self.stats["replayed"] += len(events)
+            if self.replay_rate:
+                ahead = replayed / self.replay_rate - (time.monotonic() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
 
 if __name__ == "__main__":
     mapping_file = "ecs_mapping.json"
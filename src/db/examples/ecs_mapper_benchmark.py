@@ -0,0 +1,151 @@
+"""
+Benchmark ECSMapper's compiled plan (map_to_ecs and map_batch) against the
+original interpreted per-event mapping loop.
+
+Usage:
+    python src/db/examples/ecs_mapper_benchmark.py --events 50000 --batch-size 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ecs_mapper import ECSMapper  # noqa: E402
+
+MAPPING = {
+    "@timestamp": "timestamp",
+    "user.id": "user_id",
+    "user.name": {"field": "user_name", "transform": "lowercase"},
+    "event.action": "action",
+    "event.category": "category",
+    "event.outcome": {"field": "outcome", "transform": "lowercase"},
+    "source.ip": "ip_address",
+    "source.port": "source_port",
+    "destination.ip": "destination_ip",
+    "destination.port": "destination_port",
+    "host.name": {"field": "hostname", "transform": "lowercase"},
+    "process.name": "process_name",
+    "process.pid": "process_id",
+    "file.path": "file_path",
+    "threat.indicator.type": {"field": "indicator_type", "transform": "uppercase"},
+}
+
+
+def generate_payloads(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    actions = ["login", "logout", "file_access", "process_start", "connection"]
+    payloads = []
+    for i in range(count):
+        payload = {
+            "user_id": str(rng.randint(1, 5000)),
+            "user_name": f"User{rng.randint(1, 5000)}",
+            "action": rng.choice(actions),
+            "category": "authentication",
+            "outcome": rng.choice(["SUCCESS", "FAILURE"]),
+            "ip_address": f"192.168.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "source_port": rng.randint(1024, 65535),
+            "destination_ip": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "destination_port": rng.choice([22, 80, 443, 3389]),
+            "hostname": f"HOST-{rng.randint(1, 200)}",
+            "process_name": "sshd",
+            "process_id": rng.randint(100, 40000),
+            "file_path": "/var/log/auth.log",
+            "indicator_type": "ipv4-addr",
+        }
+        if i % 3:
+            payload["timestamp"] = "2023-05-01T12:34:56Z"
+        payloads.append(payload)
+    return payloads
+
+
+def interpreted_map_to_ecs(mapping, payload):
+    """The original ECSMapper.map_to_ecs, which re-walked the mapping per event."""
+    ecs_event = {}
+    for ecs_field, source_field in mapping.items():
+        if isinstance(source_field, str):
+            value = payload.get(source_field)
+        elif isinstance(source_field, dict):
+            value = None
+            if "field" in source_field and "transform" in source_field:
+                value = payload.get(source_field["field"])
+                if source_field["transform"] == "uppercase":
+                    value = value.upper() if value else None
+                elif source_field["transform"] == "lowercase":
+                    value = value.lower() if value else None
+                else:
+                    value = None
+        else:
+            continue
+        if value is not None:
+            obj = ecs_event
+            parts = ecs_field.split(".")
+            for part in parts[:-1]:
+                if part not in obj:
+                    obj[part] = {}
+                obj = obj[part]
+            obj[parts[-1]] = value
+    if "@timestamp" not in ecs_event:
+        ecs_event["@timestamp"] = datetime.utcnow().isoformat()
+    return ecs_event
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:,.0f} events/s ({seconds * 1e6 / count:.2f} us/event)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(MAPPING, f)
+        mapping_file = f.name
+    try:
+        mapper = ECSMapper(mapping_file, reload_interval=None)
+    finally:
+        os.unlink(mapping_file)
+
+    payloads = generate_payloads(args.events)
+    batches = [payloads[i:i + args.batch_size] for i in range(0, len(payloads), args.batch_size)]
+
+    # The compiled plan must produce the same events as the interpreted loop
+    sample = payloads[:1000]
+    expected_events = [interpreted_map_to_ecs(MAPPING, payload) for payload in sample]
+    for payload, expected, actual in zip(sample, expected_events, mapper.map_batch(sample)):
+        if "timestamp" not in payload:
+            # Ingest timestamps differ by design (one per batch)
+            expected.pop("@timestamp")
+            actual.pop("@timestamp")
+        assert expected == actual, (expected, actual)
+
+    def best_of(fn):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    interpreted = best_of(lambda: [interpreted_map_to_ecs(MAPPING, payload) for payload in payloads])
+    per_event = best_of(lambda: [mapper.map_to_ecs(payload) for payload in payloads])
+    rows = best_of(lambda: [mapper.map_batch(batch) for batch in batches])
+    columns = best_of(lambda: [mapper.map_batch(batch, columnar=True) for batch in batches])
+
+    print(f"events={args.events} batch_size={args.batch_size} fields={len(MAPPING)}")
+    print(f"interpreted (per event):  {_rate(args.events, interpreted)}")
+    print(f"map_to_ecs (compiled):    {_rate(args.events, per_event)}  x{interpreted / per_event:.1f}")
+    print(f"map_batch (rows):         {_rate(args.events, rows)}  x{interpreted / rows:.1f}")
+    print(f"map_batch (columnar):     {_rate(args.events, columns)}  x{interpreted / columns:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Drive AsyncLogstashSender against a local Logstash HTTP stand-in.
+
+The stand-in accepts NDJSON bulk bodies (optionally with injected latency) and
+counts received events. The benchmark reports delivered events/sec, p50/p99
+enqueue latency (time a producer spends in send(), i.e. backpressure) and the
+number of TCP connections the sender opened. With --outage the stand-in
+answers 503 for the first N seconds, exercising the disk spool and replay.
+
+Usage:
+    python src/db/examples/logstash_sender_benchmark.py --events 100000 --latency 0.005
+    python src/db/examples/logstash_sender_benchmark.py --events 100000 --outage 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ecs_mapper import AsyncLogstashSender  # noqa: E402
+from spool import DiskSpool  # noqa: E402
+
+
+class LogstashStandIn:
+    def __init__(self, latency: float = 0.0, outage: float = 0.0):
+        self.latency = latency
+        self.down_until = time.monotonic() + outage
+        self.events = 0
+        self.requests = 0
+        self.connections = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        body = await request.read()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if time.monotonic() < self.down_until:
+            return web.Response(status=503, text="unavailable")
+        self.events += body.count(b"\n")
+        return web.Response(text="ok")
+
+    async def start(self, port: int) -> web.AppRunner:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args):
+    stand_in = LogstashStandIn(latency=args.latency, outage=args.outage)
+    runner = await stand_in.start(args.port)
+    event = {"@timestamp": "2023-05-01T12:34:56Z", "event": {"action": "login"},
+             "source": {"ip": "192.168.1.1"}, "user": {"id": "12345"}}
+    per_producer = args.events // args.producers
+    enqueue_latencies = []
+    spool_dir = tempfile.mkdtemp(prefix="logstash-spool-") if args.outage else None
+
+    sender = AsyncLogstashSender(
+        f"http://127.0.0.1:{args.port}/", batch_size=args.batch_size, linger=args.linger,
+        queue_size=args.queue_size, max_in_flight=args.max_in_flight, pool_size=args.max_in_flight,
+        spool=DiskSpool(spool_dir) if spool_dir else None, replay_interval=0.1,
+    )
+
+    async def producer():
+        for _ in range(per_producer):
+            start = time.perf_counter()
+            await sender.send(event)
+            enqueue_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with sender:
+        await asyncio.gather(*(producer() for _ in range(args.producers)))
+        while sender.spool is not None and sender.spool.pending:
+            await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    await runner.cleanup()
+
+    print(f"events={stand_in.events} requests={stand_in.requests} connections={len(stand_in.connections)} "
+          f"failed={sender.stats['failed']} spooled={sender.stats['spooled']} replayed={sender.stats['replayed']}")
+    print(f"throughput: {stand_in.events / elapsed:,.0f} events/s over {elapsed:.2f}s")
+    print(f"enqueue latency: p50={percentile(enqueue_latencies, 50) * 1e6:.1f}us "
+          f"p99={percentile(enqueue_latencies, 99) * 1e6:.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--linger", type=float, default=0.05)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected stand-in latency per request (s)")
+    parser.add_argument("--outage", type=float, default=0.0, help="Seconds the stand-in rejects requests")
+    parser.add_argument("--port", type=int, default=5055)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,15 @@ from typing import Any, List, Optional, Tuple
 
 
 class SQLite3Database:
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, check_same_thread: bool = True):
         self.db_name = db_name
+        self.check_same_thread = check_same_thread
         self.conn = None
         self.cursor = None
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            self.conn = sqlite3.connect(self.db_name, check_same_thread=self.check_same_thread)
             self.cursor = self.conn.cursor()
             print(f"Connected to {self.db_name}")
         except sqlite3.Error as e:
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Position = Tuple[int, int]
+
+
+class DiskSpool:
+    """
+    Append-only, segment-based write-ahead spool for ECS events.
+
+    Events are appended as JSON lines to the active segment file. Every
+    append is handed to the OS straight away, so a process crash loses
+    nothing; fsyncs are batched (every fsync_batch events, or within
+    fsync_interval seconds via a background thread, whichever comes first),
+    so appends stay cheap on the ingest path and only a power loss can cost
+    the last fsync_interval seconds.
+    A cursor file records the position of the last acknowledged event; read()
+    resumes from it in append order and ack() advances it and deletes segments
+    that are fully acknowledged. Each process start rolls to a fresh segment,
+    so a line torn by a crash is only ever at the tail of a sealed segment and
+    is skipped on replay.
+    """
+
+    SEGMENT_SUFFIX = ".seg"
+    CURSOR_FILE = "cursor.json"
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 fsync_batch: int = 1000, fsync_interval: float = 1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        segments = self._segments()
+        self._cursor = self._load_cursor(segments)
+        self._active_id = max(segments[-1] if segments else 0, self._cursor[0]) + 1
+        if not segments:
+            self._cursor = (self._active_id, 0)
+        self._active = open(self._segment_path(self._active_id), "ab")
+        self._active_size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="spool-fsync", daemon=True)
+        self._syncer.start()
+
+    # Writing
+
+    def append(self, event: Dict[str, Any]):
+        self.append_many([event])
+
+    def append_many(self, events: List[Dict[str, Any]]):
+        data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events).encode()
+        with self._lock:
+            self._active.write(data)
+            self._active.flush()
+            self._active_size += len(data)
+            self._unsynced += len(events)
+            if (self._unsynced >= self.fsync_batch
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            if self._active_size >= self.segment_bytes:
+                self._roll()
+
+    def flush(self):
+        """Force buffered events to disk."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        self._closed.set()
+        self._syncer.join()
+        with self._lock:
+            self._sync()
+            self._active.close()
+
+    def _sync_loop(self):
+        # fsync events left behind when appends stop before fsync_batch is reached
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+
+    def _sync(self):
+        self._active.flush()
+        if self._unsynced:
+            os.fsync(self._active.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _roll(self):
+        self._sync()
+        self._active.close()
+        self._active_id += 1
+        self._active = open(self._segment_path(self._active_id), "ab")
+        self._active_size = 0
+
+    # Reading and acknowledgement
+
+    @property
+    def pending(self) -> bool:
+        """True while there are spooled events that have not been acknowledged."""
+        with self._lock:
+            return self._cursor != (self._active_id, self._active_size)
+
+    def read(self, max_events: int) -> Tuple[List[Dict[str, Any]], Position]:
+        """
+        Return up to max_events unacknowledged events in append order, and the
+        position to pass to ack() once they have been delivered.
+        """
+        with self._lock:
+            self._active.flush()
+            segment_id, offset = self._cursor
+            active_id = self._active_id
+
+        events: List[Dict[str, Any]] = []
+        while len(events) < max_events and segment_id <= active_id:
+            path = self._segment_path(segment_id)
+            if not os.path.exists(path):
+                segment_id, offset = segment_id + 1, 0
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while len(events) < max_events:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError as e:
+                        print(f"Skipping corrupt spool record in {path}: {e}")
+            if len(events) < max_events and segment_id < active_id:
+                # Sealed segment exhausted (any torn tail is skipped)
+                segment_id, offset = segment_id + 1, 0
+            else:
+                break
+        return events, (segment_id, offset)
+
+    def ack(self, position: Position):
+        """Mark everything before position as delivered and compact old segments."""
+        with self._lock:
+            if position <= self._cursor:
+                return
+            self._cursor = position
+            tmp = os.path.join(self.directory, self.CURSOR_FILE + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"segment": position[0], "offset": position[1]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, self.CURSOR_FILE))
+            for segment_id in self._segments():
+                if segment_id < position[0]:
+                    os.remove(self._segment_path(segment_id))
+
+    def replay(self, send_batch: Callable[[List[Dict[str, Any]]], bool], batch_size: int = 500,
+               max_events_per_sec: Optional[float] = None,
+               stop: Optional[threading.Event] = None) -> int:
+        """
+        Deliver spooled events in order through send_batch, acknowledging each
+        batch it reports as sent. Stops when the spool is drained, when
+        send_batch returns False (endpoint still down) or when stop is set.
+        max_events_per_sec bounds replay throughput so a recovering endpoint is
+        not flooded. Returns the number of events replayed.
+        """
+        replayed = 0
+        started = time.monotonic()
+        while not (stop and stop.is_set()):
+            events, position = self.read(batch_size)
+            if not events:
+                if position > self._cursor:
+                    # Only skipped records (torn or corrupt) remained before position
+                    self.ack(position)
+                    continue
+                break
+            if not send_batch(events):
+                break
+            self.ack(position)
+            replayed += len(events)
+            if max_events_per_sec:
+                ahead = replayed / max_events_per_sec - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return replayed
+
+    # Files
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{segment_id:012d}{self.SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[:-len(self.SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(self.SEGMENT_SUFFIX) and name[:-len(self.SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _load_cursor(self, segments: List[int]) -> Position:
+        try:
+            with open(os.path.join(self.directory, self.CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return cursor["segment"], cursor["offset"]
+        except (OSError, ValueError, KeyError):
+            return (segments[0] if segments else 1), 0
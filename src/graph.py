@@ -81,6 +81,11 @@ class PlanExecute(TypedDict):
     response: str
 
 
+from db.checkpointer import get_checkpointer
+
+from plan_cache import get_plan_step_cache
+
+
 from pydantic import BaseModel, Field
 
 
@@ -105,4 +110,89 @@ if agent == threat_detection:
     )
     planner = planner_prompt | ChatOpenAI(
         model=llm, temperature=0
-    ).with_structured_output(Plan)
\ No newline at end of file
+    ).with_structured_output(Plan)
+
+
+from typing import Union
+
+
+class Response(BaseModel):
+    """Response to user."""
+
+    response: str
+
+
+class Act(BaseModel):
+    """Action to perform."""
+
+    action: Union[Response, Plan] = Field(
+        description="Action to perform. If you want to respond to user, use Response. "
+        "If you need to further use tools to get the answer, use Plan."
+    )
+
+
+replanner_prompt = ChatPromptTemplate.from_template(
+    """For the given objective, come up with a simple step by step plan. \
+This plan should involve individual tasks, that if executed correctly will yield the correct answer. Do not add any superfluous steps. \
+The result of the final step should be the final answer. Make sure that each step has all the information needed - do not skip steps.
+
+Your objective was this:
+{input}
+
+Your original plan was this:
+{plan}
+
+You have currently done the follow steps:
+{past_steps}
+
+Update your plan accordingly. If no more steps are needed and you can return to the user, then respond with that. Otherwise, fill out the plan. Only add steps to the plan that still NEED to be done. Do not return previously done steps as part of the plan."""
+)
+replanner = replanner_prompt | ChatOpenAI(
+    model=llm, temperature=0
+).with_structured_output(Act)
+
+
+def execute_step(state: PlanExecute):
+    plan = state["plan"]
+    plan_str = "\n".join(f"{i + 1}. {step}" for i, step in enumerate(plan))
+    task = plan[0]
+    task_formatted = f"""For the following plan:
+{plan_str}\n\nYou are tasked with executing step {1}, {task}."""
+    agent_response = agent_executor.invoke({"messages": [("user", task_formatted)]})
+    return {"past_steps": [(task, agent_response["messages"][-1].content)]}
+
+
+def plan_step(state: PlanExecute):
+    plan = planner.invoke({"messages": [("user", state["input"])]})
+    return {"plan": plan.steps}
+
+
+def replan_step(state: PlanExecute):
+    output = replanner.invoke(state)
+    if isinstance(output.action, Response):
+        return {"response": output.action.response}
+    return {"plan": output.action.steps}
+
+
+def should_end(state: PlanExecute):
+    if "response" in state and state["response"]:
+        return END
+    return "agent"
+
+
+def build_plan_execute_graph(checkpointer=None):
+    """
+    Compile the plan-execute graph. Checkpoints go to get_checkpointer() (opened
+    on first build) unless another saver is passed, so finished steps survive
+    restarts; resume a run with app.invoke(None, {"configurable": {"thread_id": ...}}).
+    """
+    workflow = StateGraph(PlanExecute)
+    workflow.add_node("planner", plan_step)
+    # Steps the planner repeats are answered from the step cache without re-running the executor
+    workflow.add_node("agent", get_plan_step_cache().memoize(execute_step))
+    workflow.add_node("replan", replan_step)
+    workflow.add_edge(START, "planner")
+    workflow.add_edge("planner", "agent")
+    workflow.add_edge("agent", "replan")
+    workflow.add_conditional_edges("replan", should_end, ["agent", END])
+    return workflow.compile(checkpointer=checkpointer or get_checkpointer())
@@ -0,0 +1,196 @@
+"""
+Parallel fan-out of the analysis agents over one event.
+
+The router picks the branches an event needs (threat, vulnerability,
+incident) and LangGraph schedules them in the same superstep, so they run
+concurrently under both invoke and ainvoke. Every branch has an edge to the
+join node, which runs once all scheduled branches have written their
+results into the shared state. End to end latency is therefore the slowest
+branch, not the sum of all three. Branches the router doesn't pick are
+never started, and a branch that exceeds its timeout is abandoned and
+reported under timed_out, so one slow agent can't hold up the join.
+
+    graph = build_parallel_graph(agent_branches(), timeout=30)
+    state = await graph.ainvoke({"event": event})
+    state["report"]
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Annotated, Any, Callable, Dict, List, Optional
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import TypedDict
+
+Branch = Callable[[Dict[str, Any]], Any]
+Router = Callable[[Dict[str, Any]], List[str]]
+Reducer = Callable[["AnalysisState"], Dict[str, Any]]
+
+THREAT = "threat"
+VULNERABILITY = "vulnerability"
+INCIDENT = "incident"
+JOIN = "join"
+
+
+def merge_dicts(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Channel reducer so concurrent branches can each write their own key."""
+    return {**(left or {}), **(right or {})}
+
+
+class AnalysisState(TypedDict, total=False):
+    event: Dict[str, Any]
+    branches: List[str]
+    results: Annotated[Dict[str, Any], merge_dicts]
+    errors: Annotated[Dict[str, str], merge_dicts]
+    timings: Annotated[Dict[str, float], merge_dicts]
+    report: Dict[str, Any]
+
+
+def _serialized(run: Callable[[Dict[str, Any]], Any]) -> Branch:
+    """The agents keep the event they analyze on the instance, so calls to one agent must not overlap."""
+    lock = threading.Lock()
+
+    def branch(event: Dict[str, Any]) -> Any:
+        with lock:
+            return run(event)
+
+    return branch
+
+
+def agent_branches(threat_agent=None, vuln_agent=None, incident_agent=None) -> Dict[str, Branch]:
+    """
+    Branches backed by ThreatDetectionAgent, VulnerabilityScannerAgent and
+    IncidentReportingAgent; agents not passed in are created with their defaults.
+    """
+    if threat_agent is None:
+        from src.agents.threat_agent import ThreatDetectionAgent
+        threat_agent = ThreatDetectionAgent()
+    if vuln_agent is None:
+        from src.agents.vuln_agent import VulnerabilityScannerAgent
+        vuln_agent = VulnerabilityScannerAgent()
+    if incident_agent is None:
+        from src.agents.incident_agent import IncidentReportingAgent
+        incident_agent = IncidentReportingAgent()
+
+    def threat(event: Dict[str, Any]) -> Any:
+        threat_agent._receive_data(event)
+        return threat_agent.analyze_threat_data()
+
+    def vulnerability(event: Dict[str, Any]) -> Any:
+        vuln_agent._receive_system_data(event)
+        return vuln_agent.scan_for_vulnerabilities()
+
+    def incident(event: Dict[str, Any]) -> Any:
+        incident_agent._receive_incident_data(event)
+        return incident_agent.analyze_incident()
+
+    return {THREAT: _serialized(threat), VULNERABILITY: _serialized(vulnerability),
+            INCIDENT: _serialized(incident)}
+
+
+def default_router(branches: List[str]) -> Router:
+    """
+    Run every branch unless the event lists the analyses it needs under
+    "analyses" (e.g. ["threat", "incident"]).
+    """
+    def route(event: Dict[str, Any]) -> List[str]:
+        wanted = event.get("analyses")
+        if not wanted:
+            return list(branches)
+        return [name for name in branches if name in wanted]
+
+    return route
+
+
+def default_reducer(state: AnalysisState) -> Dict[str, Any]:
+    """Combine branch outputs into one report, with the latency actually paid versus running them in turn."""
+    timings = state.get("timings") or {}
+    errors = state.get("errors") or {}
+    return {
+        "branches": state.get("branches", []),
+        "results": state.get("results") or {},
+        "errors": errors,
+        "timed_out": sorted(name for name, error in errors.items() if error == "timeout"),
+        "latency": max(timings.values(), default=0.0),
+        "sequential_latency": sum(timings.values()),
+    }
+
+
+def _branch_node(name: str, run: Branch, timeout: Optional[float], executor: Executor) -> RunnableLambda:
+    """
+    Graph node for one branch. The agents are synchronous, so both variants
+    run them on a worker thread and stop waiting after timeout; a timed-out
+    call finishes in the background but its result is discarded.
+    """
+    def record(started: float, update: Dict[str, Any]) -> Dict[str, Any]:
+        update["timings"] = {name: time.perf_counter() - started}
+        return update
+
+    def node(state: AnalysisState) -> Dict[str, Any]:
+        started = time.perf_counter()
+        future = executor.submit(run, state["event"])
+        try:
+            return record(started, {"results": {name: future.result(timeout)}})
+        except FutureTimeoutError:
+            future.cancel()
+            return record(started, {"errors": {name: "timeout"}})
+        except Exception as e:
+            print(f"Analysis branch {name} failed: {e}")
+            return record(started, {"errors": {name: str(e)}})
+
+    async def anode(state: AnalysisState) -> Dict[str, Any]:
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(executor, run, state["event"])
+        try:
+            return record(started, {"results": {name: await asyncio.wait_for(future, timeout)}})
+        except asyncio.TimeoutError:
+            return record(started, {"errors": {name: "timeout"}})
+        except Exception as e:
+            print(f"Analysis branch {name} failed: {e}")
+            return record(started, {"errors": {name: str(e)}})
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+
+def build_parallel_graph(branches: Dict[str, Branch], router: Optional[Router] = None,
+                         reducer: Reducer = default_reducer, timeout: Optional[float] = 60.0,
+                         timeouts: Optional[Dict[str, float]] = None, max_workers: Optional[int] = None):
+    """
+    Compile the fan-out graph: START -> route -> selected branches (in
+    parallel) -> join -> END. timeouts overrides timeout per branch, and
+    max_workers bounds the threads running agent calls across all runs.
+    """
+    router = router or default_router(list(branches))
+    timeouts = timeouts or {}
+    executor = ThreadPoolExecutor(max_workers=max_workers or 4 * len(branches),
+                                  thread_name_prefix="analysis-branch")
+
+    def route(state: AnalysisState) -> Dict[str, Any]:
+        selected = [name for name in router(state["event"]) if name in branches]
+        return {"branches": selected}
+
+    def fan_out(state: AnalysisState) -> List[str]:
+        return state["branches"] or [JOIN]
+
+    def join(state: AnalysisState) -> Dict[str, Any]:
+        return {"report": reducer(state)}
+
+    graph = StateGraph(AnalysisState)
+    graph.add_node("route", route)
+    for name, run in branches.items():
+        graph.add_node(name, _branch_node(name, run, timeouts.get(name, timeout), executor))
+        graph.add_edge(name, JOIN)
+    graph.add_node(JOIN, join)
+    graph.add_edge(START, "route")
+    graph.add_conditional_edges("route", fan_out, [*branches, JOIN])
+    graph.add_edge(JOIN, END)
+    return graph.compile()
+
+
+async def analyze_event(graph, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one event through a compiled fan-out graph and return the joined report."""
+    state = await graph.ainvoke({"event": event})
+    return state["report"]
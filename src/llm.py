@@ -1,4 +1,5 @@
 import os
+import time
 from typing import Optional, Dict, List, Tuple
 from dotenv import load_dotenv, find_dotenv
 from google.cloud import secretmanager
@@ -6,9 +7,12 @@ import openai
 from langchain_anthropic import ChatAnthropic
 from
 from llama_index import ChatOllama
-from portkey_ai import Portkey
 from portkey_ai.exceptions import PortkeyAPIError, PortkeyRateLimitError
 from core_agent import AGEAN
+from llm_cache import LLMResponseCache, get_response_cache
+from llm_clients import get_client_registry
+from llm_gateway import backoff_delay
+from llm_prompt_cache import get_prompt_cache_stats, get_system_prefixes, with_cache_control
 from src.utils.prompts_config import ThreatDetectionPrompts, VulnerabilityScannerPrompts, IncidenceResponsePrompts
 import json
 
@@ -103,62 +107,80 @@ import json
     Leveraging the Portkey AI Gateway to route LLM calls, load balance and rate limit.
     DEV NOTE: Still developing an understanding of the tool and how it cleanly fits the architecture.
     '''
-    def get_chat_completion_with_fallback(messages, model, max_tokens, cti_prompts: CTIPrompts, max_retries=3):
+    def get_chat_completion_with_fallback(messages, model, max_tokens, cti_prompts: CTIPrompts, max_retries=3,
+                                          temperature=None, cache: Optional[LLMResponseCache] = None,
+                                          agent: str = "Anthropic Agent"):
         """
         Attempts to get a chat completion using Anthropic, with fallback to OpenAI on failure or load balancing.
         Incorporates CTI prompts and session management via CTIPrompts class.
+        temperature is only sent when given (the provider default otherwise); completions requested
+        with an explicit temperature of 0 are served from the response cache when possible.
+        The CTI system block is rendered once per CTIPrompts and sent to Anthropic as a cached prompt prefix.
         """
-        llm_config = get_llm_config()
-        portkey_api_key = get_env_variable("PORTKEY_API_KEY")
-        claude_virtual_key = get_env_variable("ANTHROPIC_VIRTUAL_KEY")
-        openai_virtual_key = get_env_variable("OPENAI_VIRTUAL_KEY")
-
-        # Initialize Portkey for Anthropic
-        portkey_anthropic = Portkey(
-            api_key=portkey_api_key,
-            virtual_key=claude_virtual_key,
-            anthropic_beta="prompt-caching-2024-07-31"
-        )
-
-        # Incorporate CTI prompts into messages
-        agent_prompts, system_prompt = cti_prompts.tools_as_message("Anthropic Agent")
-
-        # Add system prompts for context
-        system_message = {
-            "role": "system",
-            "content": system_prompt
-        }
-        messages.insert(0, system_message)
+        # Stable prefix: memoized CTI system prompts plus the agent's prompts
+        system_message = get_system_prefixes().system_message(cti_prompts, agent)
+        messages = [system_message] + list(messages)
+
+        # Identical deterministic requests are answered without touching the gateway
+        cache = cache or get_response_cache()
+        cache_key = cache.key(model, messages, max_tokens, "anthropic") if temperature == 0 else None
+        sampling = {} if temperature is None else {"temperature": temperature}
+        if cache_key:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        # Clients, secrets and config are shared across calls (see llm_clients)
+        registry = get_client_registry(config_loader=get_llm_config)
+        llm_config = registry.llm_config()
+        portkey_anthropic = registry.client("anthropic")
 
         retry_count = 0
         while retry_count < max_retries:
             try:
-                # Attempt Anthropic call
+                # Attempt Anthropic call, with cache breakpoints after the stable prefix
+                started = time.monotonic()
                 chat_completion = portkey_anthropic.chat.completions.create(
-                    messages=messages,
+                    messages=with_cache_control(messages),
                     model=model,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    **sampling
                 )
-                return chat_completion.choices[0].message.content
+                get_prompt_cache_stats().record(agent, getattr(chat_completion, "usage", None),
+                                                time.monotonic() - started)
+                content = chat_completion.choices[0].message.content
+                if cache_key and content is not None:
+                    cache.put(cache_key, content)
+                return content
 
             except (PortkeyRateLimitError, PortkeyAPIError) as e:
                 retry_count += 1
                 print(f"Anthropic API error: {e}. Retry {retry_count}/{max_retries}.")
+                if retry_count < max_retries:
+                    time.sleep(backoff_delay(retry_count - 1))
 
                 # If retries exhausted, fallback to OpenAI
                 if retry_count == max_retries:
                     print("Falling back to OpenAI after retries exhausted.")
-                    portkey_openai = Portkey(
-                        api_key=portkey_api_key,
-                        virtual_key=openai_virtual_key
-                    )
+                    fallback_model = "gpt-4-turbo"  # OpenAI model example
+                    # The fallback's answers are cached under its own provider and model
+                    fallback_key = cache.key(fallback_model, messages, max_tokens, "openai") if cache_key else None
+                    if fallback_key:
+                        cached = cache.get(fallback_key)
+                        if cached is not None:
+                            return cached
+                    portkey_openai = registry.client("openai")
                     try:
                         chat_completion = portkey_openai.chat.completions.create(
                             messages=messages,
-                            model="gpt-4-turbo",  # OpenAI model example
-                            max_tokens=max_tokens
+                            model=fallback_model,
+                            max_tokens=max_tokens,
+                            **sampling
                         )
-                        return chat_completion.choices[0].message.content
+                        content = chat_completion.choices[0].message.content
+                        if fallback_key and content is not None:
+                            cache.put(fallback_key, content)
+                        return content
                     except (PortkeyRateLimitError, PortkeyAPIError) as e:
                         print(f"OpenAI API error: {e}. Fallback failed.")
                         return None
@@ -169,7 +191,7 @@ import json
         """
         Sets up the appropriate LLM provider (Anthropic, OpenAI, or Ollama) based on the provider name.
         """
-        llm_config = get_llm_config()
+        llm_config = get_client_registry(config_loader=get_llm_config).llm_config()
 
         if provider == "anthropic":
             return ChatAnthropic(api_key=llm_config["providers"][0]["key"], model=llm_config["providers"][0]["model"], temperature=0.0)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for deterministic (temperature 0) chat completions.
+
+    Keys are a SHA-256 of the canonical JSON of (provider, model, messages,
+    max_tokens), where provider and model are the ones that actually answered,
+    so a fallback provider's answer is never served for the primary model.
+    The first tier is an in-process LRU bounded by entry count and bytes; the
+    optional second tier is a SQLite file shared across processes and restarts,
+    bounded by bytes. Both tiers expire entries after `ttl` seconds. Hits in the
+    SQLite tier are promoted into memory. Safe to share across threads.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 10000,
+                 max_bytes: int = 32 * 1024 * 1024, sqlite_path: Optional[str] = None,
+                 sqlite_max_bytes: int = 512 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_bytes = sqlite_max_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self.counters = {"memory_hits": 0, "sqlite_hits": 0, "misses": 0,
+                         "evictions": 0, "expirations": 0, "stores": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._sqlite_bytes = 0
+        if sqlite_path:
+            self._open_sqlite(sqlite_path)
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, Any]], max_tokens: int, provider: str = "") -> str:
+        canonical = json.dumps({"provider": provider, "model": model, "messages": messages,
+                                "max_tokens": max_tokens},
+                               sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                self._remove_memory(key)
+                self.counters["expirations"] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at > now:
+                        self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        self._store_memory(key, value, expires_at)
+                        self.counters["sqlite_hits"] += 1
+                        return value
+                    self._delete_sqlite(key)
+                    self.counters["expirations"] += 1
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            if self._conn is not None:
+                self._store_sqlite(key, value, expires_at)
+            self.counters["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+                self._sqlite_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["sqlite_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "sqlite_bytes": self._sqlite_bytes,
+            }
+
+    # In-process tier
+
+    def _store_memory(self, key: str, value: str, expires_at: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._remove_memory(key)
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            self._remove_memory(next(iter(self._memory)))
+            self.counters["evictions"] += 1
+
+    def _remove_memory(self, key: str):
+        _, _, size = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    # SQLite tier
+
+    def _open_sqlite(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+        self._sqlite_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _store_sqlite(self, key: str, value: str, expires_at: float):
+        size = len(value.encode("utf-8"))
+        previous = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, expires_at, time.time()))
+        self._sqlite_bytes += size - (previous[0] if previous else 0)
+        while self._sqlite_bytes > self.sqlite_max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (row[0],))
+            self._sqlite_bytes -= row[1]
+            self.counters["evictions"] += 1
+        self._conn.commit()
+
+    def _delete_sqlite(self, key: str):
+        row = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            self._sqlite_bytes -= row[0]
+
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> LLMResponseCache:
+    """
+    Return the process-wide response cache, configured from the environment:
+    LLM_CACHE_TTL (seconds), LLM_CACHE_MAX_BYTES and, to enable the persistent
+    tier, LLM_CACHE_DB (path to a SQLite file).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(
+                ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+                sqlite_path=os.getenv("LLM_CACHE_DB") or None,
+            )
+        return _default_cache
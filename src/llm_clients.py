@@ -0,0 +1,214 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from portkey_ai import AsyncPortkey, Portkey
+
+# Portkey virtual key (environment variable) and fixed client options per provider
+PROVIDER_VIRTUAL_KEYS = {
+    "anthropic": "ANTHROPIC_VIRTUAL_KEY",
+    "openai": "OPENAI_VIRTUAL_KEY",
+}
+PROVIDER_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "anthropic": {"anthropic_beta": "prompt-caching-2024-07-31"},
+}
+
+
+def _env_secret(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"Environment variable {name} not found.")
+    return value
+
+
+class ProviderClientRegistry:
+    """
+    Process-wide registry of Portkey clients, one per provider.
+
+    Secrets and the LLM config are resolved once and re-resolved every
+    refresh_interval seconds instead of per call, so Secret Manager round trips
+    leave the hot path. Each provider gets one sync client for the process and
+    one async client per event loop, each backed by its own keep-alive httpx
+    pool, so connections stay warm between calls. A rotated secret yields a new
+    client on the next lookup; the old one is closed after close_grace seconds
+    so requests still running on it can finish. Secrets and config are loaded
+    outside the registry lock (one load per name at a time), so a slow Secret
+    Manager call only delays callers waiting for that value. All methods are
+    safe to call from multiple threads and asyncio tasks.
+    """
+
+    def __init__(self, secret_loader: Callable[[str], str] = _env_secret,
+                 config_loader: Optional[Callable[[], Dict[str, Any]]] = None,
+                 refresh_interval: float = 900.0, max_connections: int = 20,
+                 keepalive_expiry: float = 60.0, timeout: float = 60.0, close_grace: float = 120.0,
+                 client_factory: Callable[..., Any] = Portkey,
+                 async_client_factory: Callable[..., Any] = AsyncPortkey):
+        self.secret_loader = secret_loader
+        self.config_loader = config_loader
+        self.refresh_interval = refresh_interval
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = timeout
+        self.close_grace = close_grace
+        self.client_factory = client_factory
+        self.async_client_factory = async_client_factory
+        self._lock = threading.RLock()
+        self._values: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._clients: Dict[str, Tuple[Tuple[str, str], Any]] = {}
+        self._pinned: Dict[str, Any] = {}
+        self._pinned_async: Dict[str, Any] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[Tuple[str, str], Any]]]" = (
+            weakref.WeakKeyDictionary())
+
+    def secret(self, name: str) -> str:
+        return self._cached(("secret", name), lambda: self.secret_loader(name))
+
+    def llm_config(self) -> Dict[str, Any]:
+        """Cached result of config_loader (e.g. llm.get_llm_config)."""
+        if self.config_loader is None:
+            raise ValueError("No config_loader configured for this registry.")
+        return self._cached(("config", ""), self.config_loader)
+
+    def _fresh(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return True, cached[1]
+            return False, None
+
+    def _cached(self, key: Tuple[str, str], loader: Callable[[], Any]) -> Any:
+        found, value = self._fresh(key)
+        if found:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            # Another thread may have loaded it while we waited
+            found, value = self._fresh(key)
+            if found:
+                return value
+            value = loader()
+            with self._lock:
+                self._values[key] = (time.monotonic() + self.refresh_interval, value)
+            return value
+
+    def _credentials(self, provider: str) -> Tuple[str, str]:
+        if provider not in PROVIDER_VIRTUAL_KEYS:
+            raise ValueError(f"Unsupported provider: {provider}")
+        return self.secret("PORTKEY_API_KEY"), self.secret(PROVIDER_VIRTUAL_KEYS[provider])
+
+    def _build(self, factory: Callable[..., Any], credentials: Tuple[str, str], provider: str,
+               http_client: Any) -> Any:
+        api_key, virtual_key = credentials
+        return factory(api_key=api_key, virtual_key=virtual_key, http_client=http_client,
+                       **PROVIDER_OPTIONS.get(provider, {}))
+
+    def register(self, provider: str, client: Any = None, async_client: Any = None):
+        """
+        Pin ready-made clients for provider (e.g. a local stand-in gateway for
+        benchmarks). Pinned clients bypass secrets and are never rebuilt.
+        """
+        with self._lock:
+            if client is not None:
+                self._pinned[provider] = client
+            if async_client is not None:
+                self._pinned_async[provider] = async_client
+
+    def client(self, provider: str) -> Any:
+        """Shared sync Portkey client for provider."""
+        with self._lock:
+            if provider in self._pinned:
+                return self._pinned[provider]
+        credentials = self._credentials(provider)
+        with self._lock:
+            cached = self._clients.get(provider)
+            if cached is not None and cached[0] == credentials:
+                return cached[1]
+            http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+            client = self._build(self.client_factory, credentials, provider, http_client)
+            self._clients[provider] = (credentials, client)
+        if cached is not None:
+            # Other threads may still be mid-request on the old client
+            retire = threading.Timer(self.close_grace, _close_quietly, args=(cached[1],))
+            retire.daemon = True
+            retire.start()
+        return client
+
+    def async_client(self, provider: str) -> Any:
+        """Shared async Portkey client for provider on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if provider in self._pinned_async:
+                return self._pinned_async[provider]
+        credentials = self._credentials(provider)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            cached = clients.get(provider)
+            if cached is not None and cached[0] == credentials:
+                return cached[1]
+            http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            client = self._build(self.async_client_factory, credentials, provider, http_client)
+            clients[provider] = (credentials, client)
+        if cached is not None:
+            # Other tasks may still be mid-request on the old client
+            loop.call_later(self.close_grace, lambda: loop.create_task(_aclose_quietly(cached[1])))
+        return client
+
+    def close(self):
+        with self._lock:
+            clients = [client for _, client in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            _close_quietly(client)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = [client for _, client in self._async_clients.pop(loop, {}).values()]
+        for client in clients:
+            await _aclose_quietly(client)
+
+
+def _close_quietly(client: Any):
+    close = getattr(client, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+async def _aclose_quietly(client: Any):
+    close = getattr(client, "close", None)
+    if close is not None:
+        try:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            pass
+
+
+_default_registry: Optional[ProviderClientRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_client_registry(config_loader: Optional[Callable[[], Dict[str, Any]]] = None) -> ProviderClientRegistry:
+    """
+    Return the process-wide registry. LLM_SECRET_REFRESH_INTERVAL (seconds)
+    controls how often secrets and config are re-resolved.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ProviderClientRegistry(
+                refresh_interval=float(os.getenv("LLM_SECRET_REFRESH_INTERVAL", "900")))
+        if config_loader is not None and _default_registry.config_loader is None:
+            _default_registry.config_loader = config_loader
+        return _default_registry
@@ -0,0 +1,345 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+from portkey_ai.exceptions import PortkeyAPIError, PortkeyRateLimitError
+
+from llm_cache import LLMResponseCache, get_response_cache
+from llm_clients import ProviderClientRegistry, get_client_registry
+from llm_prompt_cache import PromptCacheStats, get_prompt_cache_stats, with_cache_control
+from llm_router import LatencyRouter, Provider, ProviderHealth
+
+# Default (requests per minute, tokens per minute) quota per provider
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "anthropic": (50.0, 40000.0),
+    "openai": (500.0, 200000.0),
+}
+# Provider tried once the primary's retries are exhausted, and the model to use there
+DEFAULT_FALLBACK: Tuple[str, str] = ("openai", "gpt-4-turbo")
+# Errors retried and then failed over like provider API errors
+RETRYABLE_ERRORS = (PortkeyRateLimitError, PortkeyAPIError, httpx.HTTPError, OSError, asyncio.TimeoutError)
+
+# Agent of the hedged call in progress, for prompt-cache stats inside router attempts
+_hedged_agent: "contextvars.ContextVar[str]" = contextvars.ContextVar("hedged_agent", default="default")
+# Providers whose rate-limit tokens the hedged call in progress already took
+_prepaid: "contextvars.ContextVar[Optional[Set[str]]]" = contextvars.ContextVar("prepaid", default=None)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _for_loop(store: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]", factory: Any) -> Any:
+    # asyncio primitives are bound to the loop that first uses them, so shared
+    # objects keep one per running loop
+    loop = asyncio.get_running_loop()
+    value = store.get(loop)
+    if value is None:
+        value = store[loop] = factory()
+    return value
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget."""
+    return len(json.dumps(messages, default=str)) // 4 + max_tokens
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket refilled continuously at per_minute / 60 per second,
+    holding at most `burst` tokens (a full minute of quota by default). Waiters
+    are served in arrival order (per event loop).
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+            weakref.WeakKeyDictionary())
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take amount tokens, waiting for the refill if needed. Returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with _for_loop(self._locks, asyncio.Lock):
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) tokens once the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMGateway:
+    """
+    Asyncio front end for chat completions through Portkey.
+
+    Every call passes a per-provider requests-per-minute and tokens-per-minute
+    token bucket and a shared concurrency limit, so a burst of alerts runs as
+    many calls in parallel as the provider quotas allow. Rate-limit and API
+    errors, and transport errors, are retried with jittered exponential
+    backoff, then the call falls back to the next provider. Calls made with an
+    explicit temperature of 0 go through the response cache, keyed by the
+    provider and model that answer. Anthropic requests get prompt-cache
+    breakpoints after their leading system messages, and cache usage is
+    tracked per agent.
+
+    With hedge set, the primary and fallback run through a LatencyRouter
+    instead of strictly one after the other: a call still unanswered after
+    the primary's p95 latency (hedge_delay until enough samples exist) is
+    also sent to the fallback, and the first answer wins. Latency samples
+    cover only the provider request itself, not token-bucket waits or retry
+    backoff, and the primary's quota is taken before the race starts, so
+    throttling ourselves neither inflates p95 nor sets off a hedge.
+    """
+
+    def __init__(self, registry: Optional[ProviderClientRegistry] = None,
+                 cache: Optional[LLMResponseCache] = None,
+                 limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_concurrency: int = 32, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 20.0,
+                 fallback: Optional[Tuple[str, str]] = DEFAULT_FALLBACK,
+                 prompt_cache_stats: Optional[PromptCacheStats] = None,
+                 hedge: bool = False, hedge_delay: float = 2.0):
+        self.registry = registry or get_client_registry()
+        self.cache = cache or get_response_cache()
+        self.prompt_cache_stats = prompt_cache_stats or get_prompt_cache_stats()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.fallback = fallback
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self._routers: Dict[Tuple[Tuple[str, str], ...], LatencyRouter] = {}
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {
+            provider: (TokenBucket(rpm), TokenBucket(tpm))
+            for provider, (rpm, tpm) in (limits or DEFAULT_LIMITS).items()
+        }
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary())
+        self.stats = {"calls": 0, "cache_hits": 0, "retries": 0, "fallbacks": 0,
+                      "failures": 0, "throttled_seconds": 0.0}
+
+    async def acomplete(self, messages: List[Dict[str, Any]], model: str, max_tokens: int,
+                        provider: str = "anthropic", temperature: Optional[float] = None,
+                        agent: str = "default") -> Optional[str]:
+        """
+        Return the completion text for messages, or None once the primary
+        provider and the fallback have both exhausted their retries.
+        temperature is only sent when given (the provider default otherwise).
+        """
+        attempts = [(provider, model)]
+        if self.fallback and self.fallback[0] != provider:
+            attempts.append(self.fallback)
+        if self.hedge and len(attempts) > 1:
+            return await self._acomplete_hedged(messages, attempts, max_tokens, temperature, agent)
+
+        for position, (name, name_model) in enumerate(attempts):
+            cache_key = self.cache.key(name_model, messages, max_tokens, name) if temperature == 0 else None
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.stats["cache_hits"] += 1
+                    return cached
+            if position:
+                self.stats["fallbacks"] += 1
+                print(f"Falling back to {name} after retries exhausted.")
+            try:
+                content = await self._call_with_retries(name, messages, name_model, max_tokens, temperature,
+                                                        agent)
+            except RETRYABLE_ERRORS as e:
+                print(f"{name} API error: {e}. Giving up on {name}.")
+                continue
+            if cache_key and content is not None:
+                self.cache.put(cache_key, content)
+            return content
+
+        self.stats["failures"] += 1
+        return None
+
+    async def _acomplete_hedged(self, messages: List[Dict[str, Any]], attempts: List[Tuple[str, str]],
+                                max_tokens: int, temperature: Optional[float], agent: str) -> Optional[str]:
+        if temperature == 0:
+            # Only the primary's own answers count as hits; a cached fallback answer is not one
+            name, name_model = attempts[0]
+            cached = self.cache.get(self.cache.key(name_model, messages, max_tokens, name))
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+
+        # Wait for the primary's own quota outside the race, so it doesn't count against the hedge delay
+        await self._throttle(attempts[0][0], messages, max_tokens)
+        token = _hedged_agent.set(agent)
+        prepaid = _prepaid.set({attempts[0][0]})
+        try:
+            winner, content = await self._router(attempts).aroute(messages, max_tokens, temperature)
+        finally:
+            _prepaid.reset(prepaid)
+            _hedged_agent.reset(token)
+        if winner is None:
+            self.stats["failures"] += 1
+            return None
+        if winner.name != attempts[0][0]:
+            self.stats["fallbacks"] += 1
+        if temperature == 0 and content is not None:
+            self.cache.put(self.cache.key(winner.model, messages, max_tokens, winner.name), content)
+        return content
+
+    def _router(self, attempts: List[Tuple[str, str]]) -> LatencyRouter:
+        # One router per (provider, model) chain, so latency history survives across calls
+        key = tuple(attempts)
+        router = self._routers.get(key)
+        if router is None:
+            providers = [Provider(name, None, name_model, self_timed=True) for name, name_model in attempts]
+            for provider in providers:
+                provider.call = self._routed_call(provider)
+            router = self._routers[key] = LatencyRouter(providers, default_hedge_delay=self.hedge_delay,
+                                                        ordered=True)
+        return router
+
+    def _routed_call(self, provider: Provider):
+        async def call(messages, model, max_tokens, temperature):
+            return await self._call_with_retries(provider.name, messages, model, max_tokens, temperature,
+                                                 _hedged_agent.get(), provider.health)
+        return call
+
+    def router_snapshot(self) -> Dict[str, Any]:
+        """LatencyRouter.snapshot() per hedged provider chain."""
+        return {" -> ".join(f"{name}:{name_model}" for name, name_model in key): router.snapshot()
+                for key, router in self._routers.items()}
+
+    async def acomplete_many(self, requests: Sequence[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Run acomplete for each request (a dict of acomplete keyword arguments)
+        concurrently; results are returned in request order, with None for any
+        request that failed, so one error never discards the others' results.
+        """
+        results = await asyncio.gather(*(self.acomplete(**request) for request in requests),
+                                       return_exceptions=True)
+        for index, result in enumerate(results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                print(f"LLM request {index} failed: {result}")
+                self.stats["failures"] += 1
+                results[index] = None
+        return results
+
+    async def _call_with_retries(self, provider: str, messages: List[Dict[str, Any]], model: str,
+                                 max_tokens: int, temperature: Optional[float], agent: str,
+                                 health: Optional[ProviderHealth] = None) -> Optional[str]:
+        attempt = 0
+        while True:
+            try:
+                return await self._call(provider, messages, model, max_tokens, temperature, agent, health)
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt >= self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = backoff_delay(attempt - 1, self.backoff_base, self.backoff_cap)
+                print(f"{provider} API error: {e}. Retry {attempt}/{self.max_retries} in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+
+    async def _throttle(self, provider: str, messages: List[Dict[str, Any]], max_tokens: int):
+        buckets = self._buckets.get(provider)
+        if buckets is not None:
+            requests_bucket, tokens_bucket = buckets
+            self.stats["throttled_seconds"] += await requests_bucket.acquire(1)
+            self.stats["throttled_seconds"] += await tokens_bucket.acquire(estimate_tokens(messages, max_tokens))
+
+    async def _call(self, provider: str, messages: List[Dict[str, Any]], model: str,
+                    max_tokens: int, temperature: Optional[float], agent: str = "default",
+                    health: Optional[ProviderHealth] = None) -> Optional[str]:
+        estimate = estimate_tokens(messages, max_tokens)
+        buckets = self._buckets.get(provider)
+        prepaid = _prepaid.get()
+        if prepaid is not None and provider in prepaid:
+            prepaid.discard(provider)
+        else:
+            await self._throttle(provider, messages, max_tokens)
+
+        if provider == "anthropic":
+            messages = with_cache_control(messages)
+
+        sampling = {} if temperature is None else {"temperature": temperature}
+        async with _for_loop(self._semaphores, lambda: asyncio.Semaphore(self.max_concurrency)):
+            self.stats["calls"] += 1
+            client = self.registry.async_client(provider)
+            started = time.monotonic()
+            try:
+                chat_completion = await client.chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    max_tokens=max_tokens,
+                    **sampling
+                )
+            except Exception:
+                if health is not None:
+                    health.record(time.monotonic() - started, False)
+                raise
+            if health is not None:
+                health.record(time.monotonic() - started, True)
+
+        # Settle the token bucket against the usage the provider reported
+        usage = getattr(chat_completion, "usage", None)
+        self.prompt_cache_stats.record(agent, usage, time.monotonic() - started)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if buckets is not None and isinstance(total_tokens, int):
+            buckets[1].adjust(estimate - total_tokens)
+        return chat_completion.choices[0].message.content
+
+
+def _limits_from_env() -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for provider, (rpm, tpm) in DEFAULT_LIMITS.items():
+        prefix = f"LLM_{provider.upper()}"
+        limits[provider] = (float(os.getenv(f"{prefix}_RPM", rpm)), float(os.getenv(f"{prefix}_TPM", tpm)))
+    return limits
+
+
+_default_gateway: Optional[LLMGateway] = None
+_default_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    Return the process-wide gateway. Quotas come from LLM_<PROVIDER>_RPM and
+    LLM_<PROVIDER>_TPM, the concurrency limit from LLM_MAX_CONCURRENCY.
+    Hedging to the fallback is off unless LLM_HEDGE=1, since every hedge is a
+    second paid call; LLM_HEDGE_DELAY sets the delay used until a provider has
+    enough latency samples.
+    """
+    global _default_gateway
+    with _default_gateway_lock:
+        if _default_gateway is None:
+            _default_gateway = LLMGateway(
+                limits=_limits_from_env(),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+                hedge=os.getenv("LLM_HEDGE", "0") == "1",
+                hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "2.0")),
+            )
+        return _default_gateway
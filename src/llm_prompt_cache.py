@@ -0,0 +1,215 @@
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+# Anthropic prompt-caching price multipliers relative to the base input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+# Base input price (USD per million tokens) used for savings reports
+DEFAULT_INPUT_PRICE_PER_MTOK = 3.0
+
+EPHEMERAL = {"type": "ephemeral"}
+
+# Agent name keyword -> CTIPrompts attribute holding that agent's prompts
+_AGENT_PROMPT_ATTRIBUTES = (
+    ("threat", "threat_prompts"),
+    ("vuln", "vuln_prompts"),
+    ("incid", "incidence_prompts"),
+)
+
+
+def _prompt_text(prompt: Any) -> str:
+    """Text of one system_prompts entry: ("system", text), {"content": text} or text."""
+    if isinstance(prompt, (tuple, list)) and len(prompt) == 2:
+        return str(prompt[1])
+    if isinstance(prompt, dict):
+        return str(prompt.get("content", ""))
+    return str(prompt)
+
+
+def _fingerprint(cti_prompts: Any) -> Tuple:
+    """
+    Cheap identity of the attributes CTIPrompts renders: string values by
+    content, everything else (prompt lists, tool dicts) by object identity.
+    Reassigning an attribute re-renders; mutating a prompt list in place does not.
+    """
+    return tuple((name, value if isinstance(value, str) or value is None else id(value))
+                 for name, value in vars(cti_prompts).items())
+
+
+class SystemPrefixCache:
+    """
+    Memoized system blocks rendered from CTIPrompts.
+
+    str(CTIPrompts) walks dir() on every call, so each request used to
+    rebuild a large, byte-identical system block. Rendered blocks are kept per
+    (CTIPrompts instance, agent) and re-rendered only if the instance's
+    attributes are reassigned. Byte-identical prefixes are also what Anthropic's
+    prompt cache needs to hit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rendered: "weakref.WeakKeyDictionary[Any, Dict[str, Tuple[Tuple, str]]]" = weakref.WeakKeyDictionary()
+
+    def system_text(self, cti_prompts: Any, agent: str) -> str:
+        fingerprint = _fingerprint(cti_prompts)
+        with self._lock:
+            cached = self._rendered.get(cti_prompts, {}).get(agent)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+        text = self._render(cti_prompts, agent)
+        with self._lock:
+            self._rendered.setdefault(cti_prompts, {})[agent] = (fingerprint, text)
+        return text
+
+    def system_message(self, cti_prompts: Any, agent: str) -> Dict[str, Any]:
+        return {"role": "system", "content": self.system_text(cti_prompts, agent)}
+
+    @staticmethod
+    def _render(cti_prompts: Any, agent: str) -> str:
+        attributes = [attribute for keyword, attribute in _AGENT_PROMPT_ATTRIBUTES if keyword in agent.lower()]
+        if not attributes:
+            attributes = [attribute for _, attribute in _AGENT_PROMPT_ATTRIBUTES]
+        agent_prompts = [_prompt_text(prompt)
+                         for attribute in attributes
+                         for prompt in (getattr(cti_prompts, attribute, None) or [])]
+        return str(cti_prompts) + "\n".join(agent_prompts)
+
+
+def with_cache_control(messages: List[Dict[str, Any]], cache_history: bool = True) -> List[Dict[str, Any]]:
+    """
+    Return a copy of messages with Anthropic cache breakpoints.
+
+    The leading system messages are the stable prefix, and the last of them
+    gets an ephemeral cache_control marker. With cache_history, the turn
+    before the final user message is marked too, so a growing conversation
+    reuses its cached history. The input list is not modified, and a message
+    that already carries a marker is left alone.
+    """
+    marked = list(messages)
+    prefix_end = 0
+    while prefix_end < len(marked) and marked[prefix_end].get("role") == "system":
+        prefix_end += 1
+    breakpoints = []
+    if prefix_end:
+        breakpoints.append(prefix_end - 1)
+    if cache_history and len(marked) - prefix_end >= 2:
+        breakpoints.append(len(marked) - 2)
+    for position in breakpoints:
+        marked[position] = _mark(marked[position])
+    return marked
+
+
+def _mark(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message.get("content")
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content, "cache_control": EPHEMERAL}]
+    elif isinstance(content, list) and content:
+        if any(isinstance(block, dict) and "cache_control" in block for block in content):
+            return message
+        blocks = list(content)
+        blocks[-1] = {**blocks[-1], "cache_control": EPHEMERAL}
+    else:
+        return message
+    return {**message, "content": blocks}
+
+
+def cache_usage(usage: Any) -> Tuple[int, int, int, int]:
+    """
+    (uncached input, cache read, cache write, output) tokens from a completion's
+    usage, accepting Anthropic field names and the OpenAI-compatible shape.
+    """
+    if usage is None:
+        return 0, 0, 0, 0
+    get = usage.get if isinstance(usage, dict) else lambda name, default=None: getattr(usage, name, default)
+    output_tokens = get("completion_tokens") or get("output_tokens") or 0
+    read = get("cache_read_input_tokens")
+    if read is None:
+        details = get("prompt_tokens_details")
+        if isinstance(details, dict):
+            read = details.get("cached_tokens")
+        elif details is not None:
+            read = getattr(details, "cached_tokens", None)
+    read = read or 0
+    write = get("cache_creation_input_tokens") or 0
+    if get("prompt_tokens") is not None:
+        # OpenAI-compatible prompt_tokens include the cached input
+        uncached = max(get("prompt_tokens") - read - write, 0)
+    else:
+        # Anthropic input_tokens already exclude it
+        uncached = get("input_tokens") or 0
+    return uncached, read, write, output_tokens
+
+
+class PromptCacheStats:
+    """
+    Per-agent prompt-cache accounting: uncached, cache-read and cache-write
+    input tokens, plus completion latency (request to full, non-streamed
+    response) split by whether the call read from the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Dict[str, float]] = {}
+
+    def record(self, agent: str, usage: Any, latency: Optional[float] = None):
+        uncached, read, write, output = cache_usage(usage)
+        with self._lock:
+            stats = self._agents.setdefault(agent, {
+                "calls": 0, "input_tokens": 0, "cache_read_input_tokens": 0,
+                "cache_creation_input_tokens": 0, "output_tokens": 0,
+                "hit_calls": 0, "hit_latency": 0.0, "miss_calls": 0, "miss_latency": 0.0,
+            })
+            stats["calls"] += 1
+            stats["input_tokens"] += uncached
+            stats["cache_read_input_tokens"] += read
+            stats["cache_creation_input_tokens"] += write
+            stats["output_tokens"] += output
+            if latency is not None:
+                kind = "hit" if read else "miss"
+                stats[f"{kind}_calls"] += 1
+                stats[f"{kind}_latency"] += latency
+
+    def report(self, input_price_per_mtok: float = DEFAULT_INPUT_PRICE_PER_MTOK) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-agent token counts, input cost with and without prompt caching,
+        and mean completion latency on cache hits versus misses.
+        """
+        price = input_price_per_mtok / 1_000_000
+        report = {}
+        with self._lock:
+            for agent, stats in self._agents.items():
+                read, write = stats["cache_read_input_tokens"], stats["cache_creation_input_tokens"]
+                uncached_cost = (stats["input_tokens"] + read + write) * price
+                cached_cost = (stats["input_tokens"] + write * CACHE_WRITE_MULTIPLIER
+                               + read * CACHE_READ_MULTIPLIER) * price
+                hit_latency = stats["hit_latency"] / stats["hit_calls"] if stats["hit_calls"] else None
+                miss_latency = stats["miss_latency"] / stats["miss_calls"] if stats["miss_calls"] else None
+                report[agent] = {
+                    "calls": stats["calls"],
+                    "input_tokens": stats["input_tokens"],
+                    "cache_read_input_tokens": read,
+                    "cache_creation_input_tokens": write,
+                    "output_tokens": stats["output_tokens"],
+                    "input_cost": cached_cost,
+                    "input_cost_without_cache": uncached_cost,
+                    "cost_saved": uncached_cost - cached_cost,
+                    "latency_hit": hit_latency,
+                    "latency_miss": miss_latency,
+                    "latency_saved": (miss_latency - hit_latency)
+                    if hit_latency is not None and miss_latency is not None else None,
+                }
+        return report
+
+
+_system_prefixes = SystemPrefixCache()
+_prompt_cache_stats = PromptCacheStats()
+
+
+def get_system_prefixes() -> SystemPrefixCache:
+    return _system_prefixes
+
+
+def get_prompt_cache_stats() -> PromptCacheStats:
+    return _prompt_cache_stats
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from llm_clients import ProviderClientRegistry, get_client_registry
+
+# async (messages, model, max_tokens, temperature or None for the provider default) -> completion text
+ProviderCall = Callable[[List[Dict[str, Any]], str, int, Optional[float]], Awaitable[Optional[str]]]
+
+
+class ProviderHealth:
+    """
+    Rolling window of recent latencies and outcomes for one provider.
+    Requests cancelled before answering (hedge losers) carry no latency or
+    outcome and are only counted.
+    """
+
+    def __init__(self, window: int = 200, max_age: float = 300.0):
+        self.max_age = max_age
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)
+        self.cancelled = 0
+
+    def record(self, latency: float, ok: bool):
+        self._samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def samples(self) -> int:
+        return len(self._recent())
+
+    def percentile(self, pct: float) -> Optional[float]:
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"samples": self.samples(), "p50": self.percentile(50), "p95": self.percentile(95),
+                "error_rate": self.error_rate(), "cancelled": self.cancelled}
+
+
+class Provider:
+    """
+    A named completion backend and the model it serves. With self_timed set,
+    the call records its own samples in health (e.g. around just the provider
+    request, leaving out local throttling and retry backoff) and the router
+    only counts cancellations.
+    """
+
+    def __init__(self, name: str, call: ProviderCall, model: str, self_timed: bool = False):
+        self.name = name
+        self.call = call
+        self.model = model
+        self.self_timed = self_timed
+        self.health = ProviderHealth()
+
+
+class LatencyRouter:
+    """
+    Latency-aware, hedged router across completion providers.
+
+    The primary for each call is drawn at random, weighted by recent health
+    (success rate squared over median latency), so traffic drifts away from a
+    provider that slows down or starts failing. Providers with fewer than
+    min_samples observations get the mean weight so they keep being probed.
+    If the primary has not answered by its own p95 latency, the call is
+    hedged to the next healthiest provider; the first successful answer wins
+    and the other request is cancelled. With ordered set, providers are always
+    tried in the given order (primary first) and latency only drives when to
+    hedge.
+    """
+
+    def __init__(self, providers: List[Provider], hedge: bool = True, hedge_percentile: float = 95.0,
+                 default_hedge_delay: float = 2.0, min_samples: int = 20, ordered: bool = False):
+        if not providers:
+            raise ValueError("LatencyRouter needs at least one provider.")
+        self.providers = {provider.name: provider for provider in providers}
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.ordered = ordered
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failures": 0}
+
+    def weights(self) -> Dict[str, float]:
+        known: Dict[str, float] = {}
+        for name, provider in self.providers.items():
+            health = provider.health
+            if health.samples() >= self.min_samples:
+                p50 = health.percentile(50)
+                success = 1.0 - health.error_rate()
+                known[name] = success * success / max(p50 or self.default_hedge_delay, 1e-3)
+        probe = sum(known.values()) / len(known) if known else 1.0
+        return {name: known.get(name, probe) for name in self.providers}
+
+    def ranked(self) -> List[Provider]:
+        """Providers ordered for one call: weighted draw for the primary, then by weight."""
+        if self.ordered:
+            return list(self.providers.values())
+        weights = self.weights()
+        names = list(weights)
+        if sum(weights.values()) > 0:
+            primary = random.choices(names, weights=[weights[name] for name in names])[0]
+        else:
+            primary = names[0]
+        rest = sorted((name for name in names if name != primary), key=weights.get, reverse=True)
+        return [self.providers[name] for name in [primary] + rest]
+
+    def hedge_delay(self, provider: Provider) -> float:
+        if provider.health.samples() < self.min_samples:
+            return self.default_hedge_delay
+        return provider.health.percentile(self.hedge_percentile) or self.default_hedge_delay
+
+    async def _attempt(self, provider: Provider, messages: List[Dict[str, Any]], max_tokens: int,
+                       temperature: Optional[float]) -> Optional[str]:
+        start = time.monotonic()
+        try:
+            result = await provider.call(messages, provider.model, max_tokens, temperature)
+        except asyncio.CancelledError:
+            # Censored: the loser's real latency is unknown, so it is not a sample
+            provider.health.cancelled += 1
+            raise
+        except Exception:
+            if not provider.self_timed:
+                provider.health.record(time.monotonic() - start, False)
+            raise
+        if not provider.self_timed:
+            provider.health.record(time.monotonic() - start, True)
+        return result
+
+    async def acomplete(self, messages: List[Dict[str, Any]], max_tokens: int,
+                        temperature: Optional[float] = None) -> Optional[str]:
+        """
+        Return the first successful completion, or None if every provider fails.
+        """
+        return (await self.aroute(messages, max_tokens, temperature))[1]
+
+    async def aroute(self, messages: List[Dict[str, Any]], max_tokens: int,
+                     temperature: Optional[float] = None) -> Tuple[Optional[Provider], Optional[str]]:
+        """acomplete, also returning the provider that answered (None if all failed)."""
+        self.stats["calls"] += 1
+        order = self.ranked()
+        pending: Dict[asyncio.Task, Provider] = {}
+        hedged = False
+
+        def launch(provider: Provider):
+            task = asyncio.ensure_future(self._attempt(provider, messages, max_tokens, temperature))
+            pending[task] = provider
+
+        primary = order.pop(0)
+        launch(primary)
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and not hedged and order and len(pending) == 1:
+                    timeout = self.hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.stats["hedged"] += 1
+                    launch(order.pop(0))
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"{provider.name} error: {e}.")
+                        continue
+                    if hedged and provider is not primary:
+                        self.stats["hedge_wins"] += 1
+                    return provider, result
+                # A finished attempt failed: replace it with the next provider
+                if order and (not pending or hedged):
+                    launch(order.pop(0))
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self.stats["failures"] += 1
+        return None, None
+
+    def snapshot(self) -> Dict[str, Any]:
+        weights = self.weights()
+        return {**self.stats, "providers": {
+            name: {**provider.health.snapshot(), "weight": weights[name]}
+            for name, provider in self.providers.items()
+        }}
+
+
+def portkey_provider(registry: ProviderClientRegistry, provider: str) -> ProviderCall:
+    """Provider call through the registry's shared async Portkey client."""
+    async def call(messages, model, max_tokens, temperature):
+        client = registry.async_client(provider)
+        sampling = {} if temperature is None else {"temperature": temperature}
+        chat_completion = await client.chat.completions.create(
+            messages=messages, model=model, max_tokens=max_tokens, **sampling)
+        return chat_completion.choices[0].message.content
+    return call
+
+
+def ollama_provider(base_url: Optional[str] = None, timeout: float = 60.0) -> ProviderCall:
+    """Provider call against a local Ollama server's /api/chat."""
+    base_url = base_url or os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    async def call(messages, model, max_tokens, temperature):
+        options = {"num_predict": max_tokens}
+        if temperature is not None:
+            options["temperature"] = temperature
+        response = await client.post("/api/chat", json={
+            "model": model, "messages": messages, "stream": False, "options": options,
+        })
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+    return call
+
+
+def router_from_config(llm_config: Dict[str, Any], registry: Optional[ProviderClientRegistry] = None,
+                       **kwargs) -> LatencyRouter:
+    """
+    Build a router over the providers listed in get_llm_config(), in order
+    (anthropic, openai, ollama).
+    """
+    registry = registry or get_client_registry()
+    providers = []
+    for entry in llm_config["providers"]:
+        name = entry["name"]
+        call = ollama_provider() if name == "ollama" else portkey_provider(registry, name)
+        providers.append(Provider(name, call, entry["model"]))
+    return LatencyRouter(providers, **kwargs)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from langsmith.run_helpers import get_current_run_tree, traceable
+
+StepNode = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+_NUMBERING = re.compile(r"^\s*(?:step\s*)?\d+\s*[.):-]\s*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+# Graph state the cached result depends on: the investigation the step belongs to
+DEFAULT_STATE_FIELDS = ("input",)
+
+
+def normalize_step(step: str) -> str:
+    """Canonical form of a plan step: no list numbering, case or spacing differences."""
+    step = _NUMBERING.sub("", step)
+    return _WHITESPACE.sub(" ", step).strip().rstrip(".").lower()
+
+
+class PlanStepCache:
+    """
+    Memoizes completed plan-execute steps.
+
+    Planners repeat steps like "look up reputation for 1.2.3.4" within and
+    across runs of an investigation. The key is a SHA-256 of the normalized
+    step text plus the state_fields of the graph state the result depends on
+    (the investigation input by default, so an ambiguous step such as
+    "summarize the findings" is never answered from another investigation;
+    pass state_fields=() to key on the step text alone). Results are
+    kept for ttl seconds in an LRU of at most max_entries. memoize() wraps an
+    execute-step node so a fresh hit returns the cached result without running
+    the executor. Steps that should never be reused (e.g. "wait for the
+    analyst") can be excluded with cacheable.
+    """
+
+    def __init__(self, ttl: float = 900.0, max_entries: int = 5000,
+                 state_fields: Sequence[str] = DEFAULT_STATE_FIELDS, cacheable: Optional[Callable[[str], bool]] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.state_fields = tuple(state_fields)
+        self.cacheable = cacheable
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expirations": 0, "evictions": 0, "stores": 0, "skipped": 0}
+
+    def key(self, step: str, state: Dict[str, Any]) -> str:
+        canonical = json.dumps({"step": normalize_step(step),
+                                "state": {field: state.get(field) for field in self.state_fields}},
+                               sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(found, result) for a fresh entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return True, result
+                del self._entries[key]
+                self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return False, None
+
+    def put(self, key: str, result: Any):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, result)
+            self._entries.move_to_end(key)
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "entries": len(self._entries),
+                    "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+    def memoize(self, node: StepNode) -> StepNode:
+        """
+        Wrap a plan-execute step node: it runs plan[0] and returns
+        {"past_steps": [(step, result)]}. Each call is traced with the cache
+        outcome and running hit rate in its LangSmith metadata.
+        """
+        @wraps(node)
+        @traceable(name="memoized_plan_step", run_type="chain")
+        def step_node(state: Dict[str, Any]) -> Dict[str, Any]:
+            step = state["plan"][0]
+            if self.cacheable is not None and not self.cacheable(step):
+                with self._lock:
+                    self.counters["skipped"] += 1
+                self._trace("skipped", None)
+                return node(state)
+
+            key = self.key(step, state)
+            found, result = self.get(key)
+            if found:
+                self._trace("hit", key)
+                return {"past_steps": [(step, result)]}
+
+            update = node(state)
+            past_steps = update.get("past_steps") or []
+            if past_steps:
+                self.put(key, past_steps[-1][1])
+            self._trace("miss", key)
+            return update
+
+        return step_node
+
+    def _trace(self, outcome: str, key: Optional[str]):
+        run = get_current_run_tree()
+        if run is None:
+            return
+        stats = self.stats()
+        run.add_metadata({"step_cache": outcome, "step_cache_key": key[:16] if key else None,
+                          "step_cache_hit_rate": round(stats["hit_rate"], 4),
+                          "step_cache_hits": stats["hits"], "step_cache_misses": stats["misses"]})
+
+
+_default_cache: Optional[PlanStepCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_plan_step_cache() -> PlanStepCache:
+    """
+    Return the process-wide plan step cache, configured from the environment:
+    PLAN_STEP_CACHE_TTL (seconds) and PLAN_STEP_CACHE_MAX_ENTRIES.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PlanStepCache(
+                ttl=float(os.getenv("PLAN_STEP_CACHE_TTL", "900")),
+                max_entries=int(os.getenv("PLAN_STEP_CACHE_MAX_ENTRIES", "5000")),
+            )
+        return _default_cache
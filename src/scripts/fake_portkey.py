@@ -0,0 +1,231 @@
+"""
+Local stand-in for the Portkey gateway.
+
+FakeGateway implements the chat.completions.create surface the LLM path uses
+(sync and async, with and without stream=True) without any network calls, so
+LLM-path changes can be load-tested and regression-benchmarked for free.
+Latency is drawn from a configurable distribution, requests over the
+requests-per-minute quota raise PortkeyRateLimitError like the real gateway's
+429s, and streamed responses yield one chunk per token at a configurable
+token rate. Messages carrying Anthropic cache_control breakpoints are billed
+as prompt-cache writes the first time their prefix is seen and as reads
+afterwards, and cached input skips the simulated prefill time. Plug it in
+with ProviderClientRegistry.register:
+
+    gateway = FakeGateway(latency=LatencyDistribution(median=0.4, sigma=0.5))
+    registry.register("anthropic", gateway.client(), gateway.async_client())
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+
+from portkey_ai.exceptions import PortkeyAPIError, PortkeyRateLimitError
+
+
+class LatencyDistribution:
+    """
+    Lognormal latency around `median` with shape `sigma` (0 gives a fixed
+    latency), plus an optional slow tail: with probability tail_probability the
+    call takes tail_latency seconds instead.
+    """
+
+    def __init__(self, median: float = 0.3, sigma: float = 0.0, tail_probability: float = 0.0,
+                 tail_latency: float = 0.0):
+        self.median = median
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.tail_latency = tail_latency
+
+    def sample(self) -> float:
+        if self.tail_probability and random.random() < self.tail_probability:
+            return self.tail_latency
+        if not self.sigma:
+            return self.median
+        return self.median * math.exp(random.gauss(0.0, self.sigma))
+
+
+def default_responder(messages: List[Dict[str, Any]], model: str, max_tokens: int) -> str:
+    """Deterministic canned answer of up to max_tokens words."""
+    words = ["No", "malicious", "activity", "detected", "for", "the", "supplied", "events."]
+    return " ".join((words * (max_tokens // len(words) + 1))[:min(max_tokens, 32)])
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (4 characters per token), as the gateway's estimates use."""
+    return max(1, len(text) // 4)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def _has_breakpoint(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return isinstance(content, list) and any(
+        isinstance(block, dict) and "cache_control" in block for block in content)
+
+
+class FakeGateway:
+    """
+    Shared state of one fake provider behind the gateway: latency model,
+    quota, error injection and counters. client() and async_client() return
+    Portkey-shaped clients bound to it.
+    """
+
+    def __init__(self, latency: Optional[LatencyDistribution] = None, rpm: Optional[float] = None,
+                 error_rate: float = 0.0, tokens_per_second: float = 200.0,
+                 prefill_per_1k_tokens: float = 0.0,
+                 responder: Callable[[List[Dict[str, Any]], str, int], str] = default_responder):
+        self.latency = latency or LatencyDistribution()
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.prefill_per_1k_tokens = prefill_per_1k_tokens
+        self.responder = responder
+        self._cached_prefixes: Set[str] = set()
+        self._lock = threading.Lock()
+        self._window: Deque[float] = deque()
+        self.stats = {"calls": 0, "rate_limited": 0, "errors": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0,
+                      "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+    def client(self) -> "FakePortkey":
+        return FakePortkey(self)
+
+    def async_client(self) -> "AsyncFakePortkey":
+        return AsyncFakePortkey(self)
+
+    def _admit(self):
+        """Apply the quota and error injection; raises like the real gateway."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rpm is not None:
+                while self._window and self._window[0] <= now - 60.0:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm:
+                    self.stats["rate_limited"] += 1
+                    raise PortkeyRateLimitError("429: rate limit exceeded (fake gateway)")
+                self._window.append(now)
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                raise PortkeyAPIError("500: upstream error (fake gateway)")
+            self.stats["calls"] += 1
+
+    def _complete(self, messages: List[Dict[str, Any]], model: str, max_tokens: int) -> Dict[str, Any]:
+        content = self.responder(messages, model, max_tokens)
+        tokens = [count_tokens(message_text(message)) for message in messages]
+        prompt_tokens = sum(tokens)
+        completion_tokens = count_tokens(content)
+
+        # Prompt caching: everything up to the last breakpoint is the cached prefix
+        read = write = 0
+        breakpoints = [i for i, message in enumerate(messages) if _has_breakpoint(message)]
+        if breakpoints:
+            prefix = messages[:breakpoints[-1] + 1]
+            key = hashlib.sha256(json.dumps([message_text(m) for m in prefix]).encode()).hexdigest()
+            prefix_tokens = sum(tokens[:breakpoints[-1] + 1])
+            with self._lock:
+                if key in self._cached_prefixes:
+                    read = prefix_tokens
+                else:
+                    self._cached_prefixes.add(key)
+                    write = prefix_tokens
+
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["cache_read_input_tokens"] += read
+            self.stats["cache_creation_input_tokens"] += write
+        return {"content": content, "model": model,
+                "prefill": (prompt_tokens - read) / 1000.0 * self.prefill_per_1k_tokens,
+                "usage": SimpleNamespace(
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                    total_tokens=prompt_tokens + completion_tokens,
+                    cache_read_input_tokens=read, cache_creation_input_tokens=write)}
+
+    @staticmethod
+    def _response(result: Dict[str, Any]) -> SimpleNamespace:
+        return SimpleNamespace(
+            model=result["model"], usage=result["usage"],
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=result["content"]))])
+
+    @staticmethod
+    def _chunks(result: Dict[str, Any]) -> List[SimpleNamespace]:
+        pieces = result["content"].split(" ")
+        chunks = [SimpleNamespace(model=result["model"], usage=None, choices=[SimpleNamespace(
+            index=0, finish_reason=None, delta=SimpleNamespace(content=piece if i == 0 else " " + piece))])
+            for i, piece in enumerate(pieces)]
+        chunks[-1].choices[0].finish_reason = "stop"
+        chunks[-1].usage = result["usage"]
+        return chunks
+
+
+class _Completions:
+    def __init__(self, gateway: FakeGateway):
+        self.gateway = gateway
+
+    def create(self, messages: List[Dict[str, Any]], model: str, max_tokens: int = 256,
+               temperature: float = 0.0, stream: bool = False, **kwargs) -> Any:
+        gateway = self.gateway
+        gateway._admit()
+        result = gateway._complete(messages, model, max_tokens)
+        time.sleep(gateway.latency.sample() + result["prefill"])
+        if not stream:
+            return gateway._response(result)
+        return self._stream(gateway._chunks(result))
+
+    def _stream(self, chunks: List[SimpleNamespace]) -> Iterator[SimpleNamespace]:
+        for chunk in chunks:
+            yield chunk
+            time.sleep(1.0 / self.gateway.tokens_per_second)
+
+
+class _AsyncCompletions:
+    def __init__(self, gateway: FakeGateway):
+        self.gateway = gateway
+
+    async def create(self, messages: List[Dict[str, Any]], model: str, max_tokens: int = 256,
+                     temperature: float = 0.0, stream: bool = False, **kwargs) -> Any:
+        gateway = self.gateway
+        gateway._admit()
+        result = gateway._complete(messages, model, max_tokens)
+        await asyncio.sleep(gateway.latency.sample() + result["prefill"])
+        if not stream:
+            return gateway._response(result)
+        return self._stream(gateway._chunks(result))
+
+    async def _stream(self, chunks: List[SimpleNamespace]):
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(1.0 / self.gateway.tokens_per_second)
+
+
+class FakePortkey:
+    """Sync Portkey-shaped client: client.chat.completions.create(...)."""
+
+    def __init__(self, gateway: FakeGateway):
+        self.chat = SimpleNamespace(completions=_Completions(gateway))
+
+    def close(self):
+        pass
+
+
+class AsyncFakePortkey:
+    """Async Portkey-shaped client: await client.chat.completions.create(...)."""
+
+    def __init__(self, gateway: FakeGateway):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(gateway))
+
+    async def close(self):
+        pass
@@ -0,0 +1,230 @@
+"""
+Benchmark of the LLM call path against the local fake Portkey gateway.
+
+Each run sends distinct alert-analysis prompts through:
+
+  * sequential: one blocking call at a time on the shared sync client, the
+    shape of get_chat_completion_with_fallback
+  * gateway:    LLMGateway.acomplete from concurrent workers, under the
+    per-provider request/token quotas
+  * router:     LatencyRouter across anthropic/openai/ollama stand-ins, hedging
+    the primary's slow tail
+  * streaming:  stream=True on the async client, reporting time to first token
+  * prompt cache: LLMGateway with a large shared CTI system prefix, reporting
+    cache read/write tokens and the cost and latency saved by prompt caching
+
+and reports calls/sec, p50/p99 latency, tokens and rate-limit rejections.
+Nothing leaves the machine, so it can be run on every LLM-path change.
+
+Usage:
+    python src/scripts/llm_benchmark.py --calls 300 --latency 0.3 --tail-probability 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from portkey_ai.exceptions import PortkeyAPIError, PortkeyRateLimitError
+
+from fake_portkey import FakeGateway, LatencyDistribution
+from llm_cache import LLMResponseCache
+from llm_clients import ProviderClientRegistry
+from llm_gateway import LLMGateway, backoff_delay
+from llm_prompt_cache import PromptCacheStats
+from llm_router import LatencyRouter, Provider, portkey_provider
+
+MODELS = {"anthropic": "claude-3-sonnet-20240229", "openai": "gpt-4o-mini", "ollama": "llama3.2:8b"}
+
+
+def alert_messages(i: int, system_prompt: str = "You are a cyber threat intelligence analyst. "
+                                                 "Classify the event.") -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f'{{"source.ip": "10.0.{i // 256}.{i % 256}", '
+                                    f'"destination.ip": "192.168.1.10", "event.action": "login-failed"}}'},
+    ]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(latencies: List[float], elapsed: float, gateways: Dict[str, FakeGateway]) -> Dict[str, float]:
+    stats = [gateway.stats for gateway in gateways.values()]
+    return {
+        "calls_per_sec": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "prompt_tokens": sum(s["prompt_tokens"] for s in stats),
+        "completion_tokens": sum(s["completion_tokens"] for s in stats),
+        "rate_limited": sum(s["rate_limited"] for s in stats),
+    }
+
+
+def build(args) -> Tuple[ProviderClientRegistry, Dict[str, FakeGateway]]:
+    primary_latency = LatencyDistribution(median=args.latency, sigma=args.sigma,
+                                          tail_probability=args.tail_probability, tail_latency=args.tail_latency)
+    gateways = {
+        "anthropic": FakeGateway(latency=primary_latency, rpm=args.provider_rpm,
+                                 prefill_per_1k_tokens=args.prefill_per_1k_tokens),
+        "openai": FakeGateway(latency=LatencyDistribution(median=args.latency * 1.3, sigma=args.sigma),
+                              rpm=args.provider_rpm),
+        "ollama": FakeGateway(latency=LatencyDistribution(median=args.latency * 2, sigma=args.sigma / 2)),
+    }
+    registry = ProviderClientRegistry(secret_loader=lambda name: "fake")
+    for name, gateway in gateways.items():
+        registry.register(name, gateway.client(), gateway.async_client())
+    return registry, gateways
+
+
+def run_sequential(args) -> Dict[str, float]:
+    registry, gateways = build(args)
+    client = registry.client("anthropic")
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.sequential_calls):
+        call_start = time.perf_counter()
+        for attempt in range(3):
+            try:
+                client.chat.completions.create(messages=alert_messages(i), model=MODELS["anthropic"],
+                                               max_tokens=args.max_tokens, temperature=0.0)
+                break
+            except (PortkeyRateLimitError, PortkeyAPIError):
+                time.sleep(backoff_delay(attempt))
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start, gateways)
+
+
+async def drive(call, total: int, concurrency: int) -> Tuple[List[float], float]:
+    """Closed loop: `concurrency` workers issue call(i) for i in range(total)."""
+    latencies: List[float] = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            call_start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - call_start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_gateway(args) -> Dict[str, float]:
+    registry, gateways = build(args)
+    gateway = LLMGateway(registry=registry, cache=LLMResponseCache(),
+                         limits={"anthropic": (args.gateway_rpm, args.gateway_tpm),
+                                 "openai": (args.gateway_rpm, args.gateway_tpm)},
+                         max_concurrency=args.concurrency)
+    latencies, elapsed = await drive(
+        lambda i: gateway.acomplete(alert_messages(i), MODELS["anthropic"], args.max_tokens),
+        args.calls, args.concurrency)
+    return summarize(latencies, elapsed, gateways)
+
+
+async def run_router(args) -> Dict[str, float]:
+    registry, gateways = build(args)
+    router = LatencyRouter([Provider(name, portkey_provider(registry, name), model)
+                            for name, model in MODELS.items()], default_hedge_delay=args.latency * 3)
+    latencies, elapsed = await drive(lambda i: router.acomplete(alert_messages(i), args.max_tokens),
+                                     args.calls, args.concurrency)
+    result = summarize(latencies, elapsed, gateways)
+    result["hedged"] = router.stats["hedged"]
+    return result
+
+
+async def run_streaming(args) -> Dict[str, float]:
+    registry, gateways = build(args)
+    client = registry.async_client("anthropic")
+    first_token: List[float] = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        stream = await client.chat.completions.create(messages=alert_messages(i), model=MODELS["anthropic"],
+                                                      max_tokens=args.max_tokens, stream=True)
+        seen = False
+        async for chunk in stream:
+            if not seen and chunk.choices[0].delta.content:
+                first_token.append(time.perf_counter() - start)
+                seen = True
+
+    latencies, elapsed = await drive(one, args.calls, args.concurrency)
+    result = summarize(latencies, elapsed, gateways)
+    result["ttft_p50"] = percentile(first_token, 50)
+    return result
+
+
+async def run_prompt_cache(args) -> Dict[str, float]:
+    registry, gateways = build(args)
+    stats = PromptCacheStats()
+    gateway = LLMGateway(registry=registry, cache=LLMResponseCache(),
+                         limits={"anthropic": (args.gateway_rpm, args.gateway_tpm)},
+                         max_concurrency=args.concurrency, prompt_cache_stats=stats)
+    # Stand-in for the rendered CTIPrompts block plus agent prompts
+    system_prompt = "You are the ThreatDetectionAgent. " + "Follow the CTI playbook. " * args.prefix_words
+    await gateway.acomplete(alert_messages(-1, system_prompt), MODELS["anthropic"], args.max_tokens,
+                            agent="ThreatDetectionAgent")
+    latencies, elapsed = await drive(
+        lambda i: gateway.acomplete(alert_messages(i, system_prompt), MODELS["anthropic"], args.max_tokens,
+                                    agent="ThreatDetectionAgent"),
+        args.calls, args.concurrency)
+    result = summarize(latencies, elapsed, gateways)
+    result["prompt_cache"] = stats.report()["ThreatDetectionAgent"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--sequential-calls", type=int, default=20,
+                        help="Calls for the sequential baseline (it is slow)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.3, help="Median provider latency (s)")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Lognormal latency shape")
+    parser.add_argument("--tail-probability", type=float, default=0.02)
+    parser.add_argument("--tail-latency", type=float, default=3.0)
+    parser.add_argument("--provider-rpm", type=float, default=6000, help="Fake gateway quota per provider")
+    parser.add_argument("--gateway-rpm", type=float, default=5000, help="LLMGateway request bucket")
+    parser.add_argument("--gateway-tpm", type=float, default=2000000, help="LLMGateway token bucket")
+    parser.add_argument("--prefill-per-1k-tokens", type=float, default=0.05,
+                        help="Simulated prefill time per 1k uncached input tokens (s)")
+    parser.add_argument("--prefix-words", type=int, default=1500, help="Size of the shared system prefix")
+    args = parser.parse_args()
+
+    results = {
+        "sequential": run_sequential(args),
+        "gateway": asyncio.run(run_gateway(args)),
+        "router (hedged)": asyncio.run(run_router(args)),
+        "streaming": asyncio.run(run_streaming(args)),
+        "prompt cache": asyncio.run(run_prompt_cache(args)),
+    }
+
+    print(f"{args.calls} calls (sequential: {args.sequential_calls}), concurrency={args.concurrency}, "
+          f"latency p50={args.latency * 1000:.0f}ms, tail {args.tail_probability:.0%} at {args.tail_latency:.1f}s")
+    for name, result in results.items():
+        extra = ""
+        if "hedged" in result:
+            extra = f"  hedged={result['hedged']}"
+        if "ttft_p50" in result:
+            extra = f"  ttft p50={result['ttft_p50'] * 1000:.0f}ms"
+        print(f"{name:16s} {result['calls_per_sec']:8.1f} calls/s  p50={result['p50'] * 1000:7.1f}ms  "
+              f"p99={result['p99'] * 1000:7.1f}ms  tokens={result['prompt_tokens']}+{result['completion_tokens']}"
+              f"  429s={result['rate_limited']}{extra}")
+
+    cache = results["prompt cache"]["prompt_cache"]
+    print(f"prompt cache: read={cache['cache_read_input_tokens']} write={cache['cache_creation_input_tokens']} "
+          f"uncached={cache['input_tokens']} tokens, input cost ${cache['input_cost']:.4f} "
+          f"vs ${cache['input_cost_without_cache']:.4f} uncached (saved ${cache['cost_saved']:.4f}), "
+          f"latency hit={cache['latency_hit'] * 1000:.0f}ms miss={cache['latency_miss'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
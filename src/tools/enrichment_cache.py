@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+Fetch = Callable[[str], Any]
+BulkFetch = Callable[[List[str]], Dict[str, Any]]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == {} or value == []
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class EnrichmentCache:
+    """
+    TTL cache in front of a CTI enrichment source.
+
+    - Results are kept for ttl seconds, "nothing known" results (per
+      is_negative) for negative_ttl, so repeat lookups of clean indicators
+      don't go upstream either.
+    - Concurrent lookups of a key that is not cached share one upstream call
+      (single flight); later callers wait on the first caller's future.
+    - For stale_ttl seconds after expiry the old value is still served while
+      a background refresh runs (stale-while-revalidate).
+    - At most max_entries keys are kept, evicting the least recently used.
+    - fetch_many() sends all of its misses upstream in one fetch_bulk call.
+      Without fetch_bulk the misses are fetched concurrently instead.
+
+    Upstream errors are not cached: they propagate to every waiting caller
+    and the next lookup retries.
+    """
+
+    def __init__(self, fetch: Fetch, fetch_bulk: Optional[BulkFetch] = None, ttl: float = 3600.0,
+                 negative_ttl: float = 300.0, stale_ttl: float = 600.0, max_entries: int = 10000,
+                 is_negative: Callable[[Any], bool] = _is_empty, max_workers: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        self.fetch = fetch
+        self.fetch_bulk = fetch_bulk
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.is_negative = is_negative
+        self.clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enrichment")
+        self.counters = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+                         "refreshes": 0, "upstream_calls": 0, "bulk_calls": 0, "errors": 0, "evictions": 0}
+
+    # Lookups
+
+    def get(self, key: str) -> Any:
+        """Cached value for key, fetching it (once, however many callers ask) if needed."""
+        with self._lock:
+            cached, future, lead = self._claim(key, self.clock())
+        if future is None:
+            return cached
+        if lead:
+            self._resolve([key], {key: future}, bulk=False)
+        return future.result()
+
+    def fetch_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Values for every key; all misses go upstream in one batch."""
+        results: Dict[str, Any] = {}
+        waiting: Dict[str, Future] = {}
+        leading: Dict[str, Future] = {}
+        with self._lock:
+            now = self.clock()
+            for key in dict.fromkeys(keys):
+                cached, future, lead = self._claim(key, now)
+                if future is None:
+                    results[key] = cached
+                else:
+                    waiting[key] = future
+                    if lead:
+                        leading[key] = future
+        if leading:
+            self._resolve(list(leading), leading, bulk=True)
+        wait(waiting.values())
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["misses"]
+            served = lookups - self.counters["misses"] + self.counters["coalesced"]
+            return {**self.counters, "size": len(self._entries), "inflight": len(self._inflight),
+                    "hit_rate": served / lookups if lookups else 0.0}
+
+    # Internals (called with the lock held unless noted)
+
+    def _claim(self, key: str, now: float) -> Tuple[Any, Optional[Future], bool]:
+        """
+        (value, None, False) when the cache can answer; otherwise
+        (None, future, lead) where lead means this caller must fetch.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self.counters["hits"] += 1
+                if self.is_negative(entry.value):
+                    self.counters["negative_hits"] += 1
+            else:
+                self.counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    self.counters["refreshes"] += 1
+                    self._inflight[key] = Future()
+                    self._executor.submit(self._resolve, [key], {key: self._inflight[key]}, False)
+            return entry.value, None, False
+
+        self.counters["misses"] += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return None, future, False
+        future = self._inflight[key] = Future()
+        return None, future, True
+
+    def _resolve(self, keys: List[str], futures: Dict[str, Future], bulk: bool):
+        """Fetch keys upstream (without the lock), store the results and settle their futures."""
+        try:
+            if bulk and self.fetch_bulk is not None:
+                with self._lock:
+                    self.counters["bulk_calls"] += 1
+                    self.counters["upstream_calls"] += 1
+                fetched = self.fetch_bulk(keys)
+                values = {key: fetched.get(key) for key in keys}
+            elif bulk and len(keys) > 1:
+                pending = {key: self._executor.submit(self._fetch_one, key) for key in keys}
+                values = {key: future.result() for key, future in pending.items()}
+            else:
+                values = {keys[0]: self._fetch_one(keys[0])}
+        except Exception as e:
+            with self._lock:
+                self.counters["errors"] += 1
+                for key in keys:
+                    self._inflight.pop(key, None)
+            for future in futures.values():
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            now = self.clock()
+            for key, value in values.items():
+                self._store(key, value, now)
+                self._inflight.pop(key, None)
+        for key, future in futures.items():
+            future.set_result(values[key])
+
+    def _fetch_one(self, key: str) -> Any:
+        with self._lock:
+            self.counters["upstream_calls"] += 1
+        return self.fetch(key)
+
+    def _store(self, key: str, value: Any, now: float):
+        fresh_until = now + (self.negative_ttl if self.is_negative(value) else self.ttl)
+        self._entries[key] = _Entry(value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
@@ -0,0 +1,299 @@
+"""
+Compact, memory-mapped index of CTI indicators (IPs, CIDRs, domains, hashes).
+
+The on-disk format is a single file that every worker maps read-only, so the
+OS page cache holds one copy and opening it costs only an mmap call:
+
+    header      "<8sIIIII": magic, version, IPv4 ranges, IPv6 ranges,
+                string indicators, label table length
+    IPv4        uint32 starts[], uint32 ends[], uint16 labels[]
+    IPv6        uint64 start_hi[], start_lo[], end_hi[], end_lo[], uint16 labels[]
+    strings     uint32 buckets[65537], uint64 digests[] (sorted), uint16 labels[]
+    labels      JSON list of label strings (feed / threat type)
+
+Each section is padded to 8 bytes. CIDRs and single IPs become sorted,
+disjoint integer intervals searched with bisect; where ranges overlap the
+most specific one keeps its label. Domains and file hashes are stored as
+sorted 8-byte BLAKE2b digests; buckets[b] is the position of the first
+digest whose top 16 bits are >= b, so a probe only bisects the few digests
+sharing its prefix. At most 65536 distinct labels fit. Builds are written
+to a temporary file and moved into place with os.replace, and readers
+notice the new inode and remap, so a feed refresh swaps the whole index
+atomically.
+
+Usage:
+    python -m src.tools.indicator_index build feed.csv indicators.idx
+(one "indicator[,label]" per line)
+"""
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.ecs_fields import network_range, parse_ip
+
+MAGIC = b"AGIDX\x00\x00\x01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIII")
+_MASK64 = (1 << 64) - 1
+_BUCKET_SHIFT = 48
+_BUCKETS = 1 << (64 - _BUCKET_SHIFT)
+MAX_LABEL = 0xFFFF  # labels are stored as uint16
+
+
+def _normalize(value: str) -> str:
+    return value.strip().lower().rstrip(".")
+
+
+def _digest(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _is_hash(value: str) -> bool:
+    return len(value) in (32, 40, 64) and not value.strip("0123456789abcdef")
+
+
+@lru_cache(maxsize=65536)
+def _lookup_keys(indicator: str) -> Tuple[Optional[Tuple[int, int]], Tuple[int, ...]]:
+    """
+    Parsed IP, or the digests to probe for a domain/hash (the name itself, then
+    each parent domain so sub.evil.example matches a listed evil.example).
+    Cached because hot indicators repeat; the keys don't depend on the index.
+    """
+    ip = parse_ip(indicator)
+    if ip is not None:
+        return ip, ()
+    value = _normalize(indicator)
+    candidates = [value]
+    if not _is_hash(value):
+        while value.count(".") > 1:
+            value = value[value.find(".") + 1:]
+            candidates.append(value)
+    return None, tuple(_digest(candidate) for candidate in candidates)
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\x00" * (-len(data) % 8)
+
+
+def _merge(ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    Flatten (start, end, label) ranges into sorted, disjoint ranges. Where
+    ranges overlap, the narrowest one's label wins (a listed IP inside a
+    listed CIDR keeps its own label), and the first listed on a tie; only
+    neighbours with the same label are merged.
+    """
+    ordered = sorted(enumerate(ranges), key=lambda item: item[1][0])
+    bounds = sorted({start for start, _, _ in ranges} | {end + 1 for _, end, _ in ranges})
+    flat: List[List[int]] = []
+    active: List[Tuple[int, int, int, int]] = []
+    position = 0
+    for start, next_start in zip(bounds, bounds[1:]):
+        while position < len(ordered) and ordered[position][1][0] <= start:
+            order, (range_start, range_end, label) = ordered[position]
+            heapq.heappush(active, (range_end - range_start, order, range_end, label))
+            position += 1
+        while active and active[0][2] < start:
+            heapq.heappop(active)
+        if not active:
+            continue
+        label = active[0][3]
+        if flat and flat[-1][2] == label and flat[-1][1] + 1 == start:
+            flat[-1][1] = next_start - 1
+        else:
+            flat.append([start, next_start - 1, label])
+    return [tuple(item) for item in flat]
+
+
+def build_index(path: str, indicators: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, int]:
+    """
+    Build an index file at path from (indicator, label) pairs and atomically
+    replace any existing index. Returns counts per section.
+    """
+    labels: Dict[str, int] = {}
+    v4: List[Tuple[int, int, int]] = []
+    v6: List[Tuple[int, int, int]] = []
+    strings: Dict[int, int] = {}
+
+    for value, label in indicators:
+        value = value.strip()
+        if not value:
+            continue
+        label_id = labels.setdefault(label or "", len(labels))
+        if label_id > MAX_LABEL:
+            raise ValueError(f"Indicator index supports at most {MAX_LABEL + 1} distinct labels; "
+                             f"group feeds under fewer labels")
+        try:
+            version, start, end = network_range(value)
+        except ValueError:
+            strings.setdefault(_digest(_normalize(value)), label_id)
+            continue
+        (v4 if version == 4 else v6).append((start, end, label_id))
+
+    v4, v6 = _merge(v4), _merge(v6)
+    digests = sorted(strings)
+    buckets = [0] * (_BUCKETS + 1)
+    for digest in digests:
+        buckets[(digest >> _BUCKET_SHIFT) + 1] += 1
+    for bucket in range(_BUCKETS):
+        buckets[bucket + 1] += buckets[bucket]
+    label_table = json.dumps(sorted(labels, key=labels.get)).encode("utf-8")
+
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(v4), len(v6), len(digests), len(label_table))]
+    parts.append(_pad(struct.pack(f"<{len(v4)}I", *(r[0] for r in v4))))
+    parts.append(_pad(struct.pack(f"<{len(v4)}I", *(r[1] for r in v4))))
+    parts.append(_pad(struct.pack(f"<{len(v4)}H", *(r[2] for r in v4))))
+    parts.append(_pad(struct.pack(f"<{len(v6)}Q", *(r[0] >> 64 for r in v6))))
+    parts.append(_pad(struct.pack(f"<{len(v6)}Q", *(r[0] & _MASK64 for r in v6))))
+    parts.append(_pad(struct.pack(f"<{len(v6)}Q", *(r[1] >> 64 for r in v6))))
+    parts.append(_pad(struct.pack(f"<{len(v6)}Q", *(r[1] & _MASK64 for r in v6))))
+    parts.append(_pad(struct.pack(f"<{len(v6)}H", *(r[2] for r in v6))))
+    parts.append(_pad(struct.pack(f"<{_BUCKETS + 1}I", *buckets)))
+    parts.append(_pad(struct.pack(f"<{len(digests)}Q", *digests)))
+    parts.append(_pad(struct.pack(f"<{len(digests)}H", *(strings[d] for d in digests))))
+    parts.append(label_table)
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        for part in parts:
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return {"ipv4_ranges": len(v4), "ipv6_ranges": len(v6), "strings": len(digests), "labels": len(labels)}
+
+
+class _MappedIndex:
+    """Typed views over one mapped index file. Immutable once opened."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, version, n4, n6, nstr, labels_len = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not an indicator index (format {FORMAT_VERSION})")
+        offset = HEADER.size
+
+        def section(count: int, fmt: str, size: int) -> memoryview:
+            nonlocal offset
+            start = offset
+            offset += count * size + (-(count * size) % 8)
+            return view[start:start + count * size].cast(fmt)
+
+        self.v4_starts, self.v4_ends, self.v4_labels = section(n4, "I", 4), section(n4, "I", 4), section(n4, "H", 2)
+        self.v6_start_hi, self.v6_start_lo = section(n6, "Q", 8), section(n6, "Q", 8)
+        self.v6_end_hi, self.v6_end_lo = section(n6, "Q", 8), section(n6, "Q", 8)
+        self.v6_labels = section(n6, "H", 2)
+        self.buckets = section(_BUCKETS + 1, "I", 4)
+        self.digests, self.digest_labels = section(nstr, "Q", 8), section(nstr, "H", 2)
+        self.labels: List[str] = json.loads(bytes(view[offset:offset + labels_len]).decode("utf-8"))
+        self.counts = {"ipv4_ranges": n4, "ipv6_ranges": n6, "strings": nstr}
+
+    def lookup_ip(self, version: int, value: int) -> Optional[int]:
+        if version == 4:
+            position = bisect_right(self.v4_starts, value) - 1
+            if position >= 0 and value <= self.v4_ends[position]:
+                return self.v4_labels[position]
+            return None
+        hi, lo = value >> 64, value & _MASK64
+        upper = bisect_right(self.v6_start_hi, hi)
+        lower = bisect_left(self.v6_start_hi, hi, 0, upper)
+        position = bisect_right(self.v6_start_lo, lo, lower, upper) - 1
+        if position < lower:
+            position = lower - 1
+        if position >= 0 and (hi, lo) <= (self.v6_end_hi[position], self.v6_end_lo[position]):
+            return self.v6_labels[position]
+        return None
+
+    def lookup_digest(self, digest: int) -> Optional[int]:
+        bucket = digest >> _BUCKET_SHIFT
+        end = self.buckets[bucket + 1]
+        position = bisect_left(self.digests, digest, self.buckets[bucket], end)
+        if position < end and self.digests[position] == digest:
+            return self.digest_labels[position]
+        return None
+
+
+class IndicatorIndex:
+    """
+    Read side of the indicator index. lookup() answers from the mapped file
+    without any network call: IPs by interval search, domains (including
+    parents of a listed domain) and file hashes by digest. The file is
+    re-checked at most every check_interval seconds and remapped when a
+    rebuild has replaced it.
+    """
+
+    def __init__(self, path: str, check_interval: Optional[float] = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = _MappedIndex(path)
+        self._next_check = time.monotonic() + (check_interval or 0)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(self._index.counts)
+
+    def reload(self) -> bool:
+        """Remap if the file was replaced. Returns True when a new index was loaded."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return False
+            current = self._index.identity
+            if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (current.st_ino, current.st_mtime_ns,
+                                                                 current.st_size):
+                return False
+            try:
+                self._index = _MappedIndex(self.path)
+            except (OSError, ValueError) as e:
+                print(f"Keeping previous indicator index; failed to open {self.path}: {e}")
+                return False
+            return True
+
+    def _current(self) -> _MappedIndex:
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            self.reload()
+        return self._index
+
+    def lookup(self, indicator: str) -> Optional[str]:
+        """Label of the matching indicator ("" if it had none), or None if unknown."""
+        index = self._current()
+        ip, digests = _lookup_keys(indicator)
+        label = index.lookup_ip(*ip) if ip is not None else None
+        for digest in digests:
+            label = index.lookup_digest(digest)
+            if label is not None:
+                break
+        return None if label is None else index.labels[label]
+
+    def __contains__(self, indicator: str) -> bool:
+        return self.lookup(indicator) is not None
+
+
+def _read_feed(path: str) -> Iterable[Tuple[str, Optional[str]]]:
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                value, _, label = line.partition(",")
+                yield value, label or None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print(__doc__)
+        sys.exit(1)
+    print(build_index(sys.argv[3], _read_feed(sys.argv[2])))
@@ -0,0 +1,89 @@
+import ipaddress
+import socket
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+Accessor = Callable[[Dict[str, Any]], Any]
+
+
+def make_accessor(field: str) -> Accessor:
+    """
+    Read an ECS field from a flat dotted event ({"source.ip": ...}), a nested
+    one ({"source": {"ip": ...}}) or the underscore form AGEAN.map_to_ecs
+    produces ({"source_ip": ...}).
+    """
+    parts = field.split(".")
+    underscored = field.replace(".", "_")
+
+    def get(event: Dict[str, Any]) -> Any:
+        if field in event:
+            return event[field]
+        if underscored in event:
+            return event[underscored]
+        value: Any = event
+        for part in parts:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    return get
+
+
+def parse_ip(value: str) -> Optional[Tuple[int, int]]:
+    """(version, integer) for an IP literal, or None; inet_pton is much cheaper than ipaddress."""
+    family = socket.AF_INET6 if ":" in value else socket.AF_INET if value[-1:].isdigit() else None
+    if family is None:
+        return None
+    try:
+        packed = socket.inet_pton(family, value)
+    except OSError:
+        return None
+    return (6 if family == socket.AF_INET6 else 4), int.from_bytes(packed, "big")
+
+
+def network_range(cidr: str) -> Tuple[int, int, int]:
+    """(version, first, last) address of a CIDR or single IP; raises ValueError for anything else."""
+    network = ipaddress.ip_network(cidr, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def merge_intervals(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent (start, end) integer intervals into a sorted list."""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class CidrSet:
+    """
+    IPv4/IPv6 networks merged into sorted integer intervals, so membership is
+    one bisect instead of a scan over every network.
+    """
+
+    def __init__(self, cidrs: Iterable[str]):
+        intervals: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for cidr in cidrs:
+            version, start, end = network_range(cidr)
+            intervals[version].append((start, end))
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        for version, ranges in intervals.items():
+            merged = merge_intervals(ranges)
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __bool__(self) -> bool:
+        return any(self._starts.values())
+
+    def __contains__(self, ip: Any) -> bool:
+        parsed = parse_ip(ip) if isinstance(ip, str) else None
+        if parsed is None:
+            return False
+        version, value = parsed
+        position = bisect_right(self._starts[version], value) - 1
+        return position >= 0 and value <= self._ends[version][position]
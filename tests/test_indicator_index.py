@@ -0,0 +1,38 @@
+import pytest
+
+from src.tools.indicator_index import MAX_LABEL, IndicatorIndex, build_index
+
+
+def _index(tmp_path, indicators):
+    path = str(tmp_path / "indicators.idx")
+    build_index(path, indicators)
+    return IndicatorIndex(path, check_interval=None)
+
+
+def test_neighbouring_ips_keep_their_own_labels(tmp_path):
+    index = _index(tmp_path, [("1.2.3.4", "feedA"), ("1.2.3.5", "feedB")])
+    assert index.lookup("1.2.3.4") == "feedA"
+    assert index.lookup("1.2.3.5") == "feedB"
+    assert index.lookup("1.2.3.6") is None
+
+
+def test_neighbouring_ips_with_one_label_merge(tmp_path):
+    index = _index(tmp_path, [("1.2.3.4", "feedA"), ("1.2.3.5", "feedA")])
+    assert index.counts["ipv4_ranges"] == 1
+    assert index.lookup("1.2.3.5") == "feedA"
+
+
+def test_most_specific_range_wins(tmp_path):
+    index = _index(tmp_path, [("10.0.0.0/8", "feedA"), ("10.1.2.3", "feedB"), ("2001:db8::/32", "feedA"),
+                              ("2001:db8::1", "feedB")])
+    assert index.lookup("10.1.2.2") == "feedA"
+    assert index.lookup("10.1.2.3") == "feedB"
+    assert index.lookup("10.1.2.4") == "feedA"
+    assert index.lookup("2001:db8::1") == "feedB"
+    assert index.lookup("2001:db8::2") == "feedA"
+
+
+def test_too_many_labels(tmp_path):
+    indicators = ((f"host{number}.example", f"feed{number}") for number in range(MAX_LABEL + 2))
+    with pytest.raises(ValueError, match="distinct labels"):
+        build_index(str(tmp_path / "indicators.idx"), indicators)